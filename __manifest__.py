@@ -20,6 +20,7 @@
         'views/number_max.xml',
         'views/generate_batch.xml',
         'security/ir.model.access.csv',
+        'data/queue_job_channel.xml',
         'data/cron.xml',
         'data/med_africa_status.xml',
         'data/fetch.xml',
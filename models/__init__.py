@@ -1,2 +1,8 @@
 from . import prestashop_product
-from . import stock_picking
\ No newline at end of file
+from . import stock_picking
+from . import prestashop_stock_mapping
+from . import prestashop_variant_image
+from . import prestashop_resource_cache
+from . import prestashop_batching
+from . import prestashop_order_import_failure
+from . import prestashop_watermark
\ No newline at end of file
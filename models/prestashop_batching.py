@@ -0,0 +1,108 @@
+import logging
+
+from odoo import models, fields, api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_SECONDS = 120
+MAX_ERROR_RATE = 0.2
+
+# workload: (initial size, min, max)
+WORKLOAD_DEFAULTS = {
+    'products': (30, 5, 100),
+    'combinations': (30, 5, 100),
+    'images': (20, 5, 100),
+    'stock': (50, 10, 200),
+    # Whole publish jobs: product, combinations, images and stock of each template
+    'publish': (10, 2, 50),
+}
+
+
+class AdaptiveBatcher:
+    """Batch size per workload, adjusted from the duration and error rate of finished jobs.
+
+    The current size is kept in prestashop.batch.size (not in a system
+    parameter: every set_param clears the ORM caches of all workers), bounded
+    by the prestashop.batch.<workload>.min / .max parameters. Each job reports
+    how long its records took; the size then moves halfway towards the number of records
+    that would fit in prestashop.batch.target_seconds. Batches with more than
+    20% errors halve the size instead.
+    """
+
+    def __init__(self, env, workload):
+        self.env = env
+        self.workload = workload
+        self.default, self.default_min, self.default_max = WORKLOAD_DEFAULTS[workload]
+
+    def _param(self, ICP, suffix, default):
+        try:
+            return int(float(ICP.get_param(f'prestashop.batch.{self.workload}.{suffix}', default)))
+        except (TypeError, ValueError):
+            return default
+
+    def _bounds(self, ICP):
+        minimum = max(self._param(ICP, 'min', self.default_min), 1)
+        maximum = max(self._param(ICP, 'max', self.default_max), minimum)
+        return minimum, maximum
+
+    def size(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        minimum, maximum = self._bounds(ICP)
+        current = self.env['prestashop.batch.size'].sudo().search([('workload', '=', self.workload)], limit=1).size
+        return min(max(current or self.default, minimum), maximum)
+
+    def record(self, count, duration, errors=0):
+        """Adjust the size from a finished batch of `count` records"""
+        if count <= 0:
+            return
+
+        ICP = self.env['ir.config_parameter'].sudo()
+        minimum, maximum = self._bounds(ICP)
+        current = self.size()
+        try:
+            target = float(ICP.get_param('prestashop.batch.target_seconds', DEFAULT_TARGET_SECONDS))
+        except (TypeError, ValueError):
+            target = DEFAULT_TARGET_SECONDS
+
+        if errors / count > MAX_ERROR_RATE:
+            new_size = current // 2
+        else:
+            per_record = max(duration, 0.001) / count
+            new_size = (current + target / per_record) / 2
+        new_size = int(min(max(new_size, minimum), maximum))
+        if new_size == current:
+            return
+
+        # Own cursor: concurrent jobs must not conflict on the row, nor lose it on rollback
+        try:
+            with self.env.registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['prestashop.batch.size']._set_size(self.workload, new_size)
+        except Exception as e:
+            _logger.warning(f"Batch size for {self.workload} not saved: {e}")
+            return
+        _logger.info(
+            f"Batch size for {self.workload}: {current} -> {new_size} "
+            f"({count} record(s) in {duration:.1f}s, {errors} error(s))"
+        )
+
+
+class PrestashopBatchSize(models.Model):
+    _name = 'prestashop.batch.size'
+    _description = 'Adaptive PrestaShop job batch size'
+    _rec_name = 'workload'
+
+    workload = fields.Char(string="Workload", required=True)
+    size = fields.Integer(string="Batch Size", required=True)
+
+    _sql_constraints = [
+        ('workload_uniq', 'unique(workload)', 'One batch size per workload.'),
+    ]
+
+    @api.model
+    def _set_size(self, workload, size):
+        record = self.search([('workload', '=', workload)], limit=1)
+        if record:
+            record.size = size
+        else:
+            self.create({'workload': workload, 'size': size})
@@ -0,0 +1,149 @@
+import threading
+import time
+import logging
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://outletna.com/api"
+DEFAULT_WS_KEY = "86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N"
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 60
+# prestashop.rate_limit: requests per second and per API host for the whole server, 0 disables
+# the limiter. Buckets live in process memory, so each worker process gets the rate divided by
+# prestashop.rate_limit_processes (default: the configured --workers, 1 in threaded mode).
+DEFAULT_RATE_LIMIT = 10
+DEFAULT_RATE_BURST = 10
+
+# One keep-alive session per (url, key, pool size) and per worker process
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# One token bucket per API host, shared by every thread of the worker process (see DEFAULT_RATE_LIMIT)
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `burst` saved up"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_rate_limiter(host, rate, burst):
+    """Return the bucket shared by all calls to `host`, updated to the current settings"""
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(host)
+        if limiter is None:
+            limiter = _LIMITERS[host] = TokenBucket(rate, burst)
+        elif (limiter.rate, limiter.burst) != (rate, max(burst, 1)):
+            with limiter.lock:
+                limiter.rate, limiter.burst = rate, max(burst, 1)
+        return limiter
+
+
+def _get_session(base_url, ws_key, pool_size):
+    """Return the pooled session shared by every call of this worker"""
+    key = (base_url, ws_key, pool_size)
+    session = _SESSIONS.get(key)
+    if session is not None:
+        return session
+
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            session.auth = (ws_key, '')
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _SESSIONS[key] = session
+            _logger.info(f"PrestaShop: opened connection pool for {base_url} (size {pool_size})")
+    return session
+
+
+class PrestashopClient:
+    """Thin wrapper around a pooled requests.Session for the PrestaShop webservice.
+
+    Paths are relative to the API root ("products/12"); absolute URLs such as
+    the xlink:href attributes returned by the webservice are used as they are.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, ws_key=DEFAULT_WS_KEY, pool_size=DEFAULT_POOL_SIZE,
+                 rate_limit=DEFAULT_RATE_LIMIT, rate_burst=DEFAULT_RATE_BURST):
+        self.base_url = base_url.rstrip('/')
+        self.ws_key = ws_key
+        self.pool_size = pool_size
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.session = _get_session(self.base_url, ws_key, pool_size)
+
+    def url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, **kwargs):
+        url = self.url(path)
+        if self.rate_limit > 0:
+            get_rate_limiter(urlparse(url).netloc, self.rate_limit, self.rate_burst).acquire()
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+
+def get_prestashop_client(env):
+    """Build the client from system parameters (prestashop.*)"""
+    ICP = env['ir.config_parameter'].sudo()
+
+    def _param(key, default, cast=int):
+        try:
+            return cast(ICP.get_param(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    processes = max(_param('prestashop.rate_limit_processes', config['workers'] or 1), 1)
+    return PrestashopClient(
+        base_url=ICP.get_param('prestashop.base_url', DEFAULT_BASE_URL),
+        ws_key=ICP.get_param('prestashop.ws_key', DEFAULT_WS_KEY),
+        pool_size=max(_param('prestashop.pool_size', DEFAULT_POOL_SIZE), 1),
+        rate_limit=_param('prestashop.rate_limit', DEFAULT_RATE_LIMIT, float) / processes,
+        rate_burst=max(_param('prestashop.rate_burst', DEFAULT_RATE_BURST) // processes, 1),
+    )
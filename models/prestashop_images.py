@@ -0,0 +1,346 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import uuid
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageOps
+
+_logger = logging.getLogger(__name__)
+
+DOWNLOAD_TIMEOUT = 30
+UPLOAD_TIMEOUT = 60
+CHUNK_SIZE = 64 * 1024
+DEFAULT_SPOOL_THRESHOLD = 1024 * 1024  # bytes kept in memory per image before spooling to disk
+
+# Keep-alive session for the image CDN(s), shared by the download workers of this process
+_DOWNLOAD_SESSION = None
+_DOWNLOAD_SESSION_LOCK = threading.Lock()
+
+
+def _get_download_session(pool_size):
+    global _DOWNLOAD_SESSION
+    with _DOWNLOAD_SESSION_LOCK:
+        if _DOWNLOAD_SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _DOWNLOAD_SESSION = session
+    return _DOWNLOAD_SESSION
+
+
+class MultipartFileStream:
+    """multipart/form-data body holding one file, read from the file object chunk by chunk.
+
+    Passed as `data=` to requests: it has a length, so the body is sent with a
+    Content-Length header and is never assembled in memory.
+    """
+
+    def __init__(self, field, filename, fileobj, size, content_type='image/jpeg'):
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode()
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+        self._parts = [io.BytesIO(head), fileobj, io.BytesIO(tail)]
+        self._length = len(head) + size + len(tail)
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and size != 0:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+
+class ImageNormalizer:
+    """Downsize and re-encode source images before they are uploaded.
+
+    Processed files are cached in `cache_dir` under the source content hash and
+    the settings, so an image is only decoded and re-encoded once. Files not
+    used for a while are removed by `prune_cache`.
+
+    Transparent images keep their alpha channel in WEBP and are flattened on
+    white in JPEG.
+    """
+
+    FORMATS = {
+        'JPEG': ('image/jpeg', 'jpg'),
+        'WEBP': ('image/webp', 'webp'),
+    }
+
+    def __init__(self, max_dimension=2000, quality=85, image_format='JPEG', cache_dir=None,
+                 spool_threshold=DEFAULT_SPOOL_THRESHOLD):
+        self.max_dimension = max(max_dimension, 1)
+        self.quality = min(max(quality, 1), 100)
+        self.image_format = image_format.upper() if image_format.upper() in self.FORMATS else 'JPEG'
+        self.content_type, self.extension = self.FORMATS[self.image_format]
+        self.cache_dir = cache_dir
+        self.spool_threshold = max(spool_threshold, 1)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def process(self, download):
+        """Replace the downloaded file by its normalised version"""
+        cache_path = None
+        if self.cache_dir:
+            cache_path = os.path.join(
+                self.cache_dir,
+                f"{download['content_hash']}-{self.max_dimension}-{self.quality}.{self.extension}"
+            )
+
+        if cache_path and os.path.exists(cache_path):
+            os.utime(cache_path)  # Last use, for prune_cache
+            output = open(cache_path, 'rb')
+        elif cache_path:
+            tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'wb') as tmp:
+                    self._encode(download['file'], tmp)
+                os.replace(tmp_path, cache_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            output = open(cache_path, 'rb')
+        else:
+            output = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+            self._encode(download['file'], output)
+            output.seek(0)
+
+        download['file'].close()
+        output.seek(0, os.SEEK_END)
+        download.update(file=output, size=output.tell(), content_type=self.content_type, extension=self.extension)
+        output.seek(0)
+
+    def _encode(self, source, target):
+        with Image.open(source) as image:
+            if image.format == 'JPEG':
+                # Let the decoder downscale, instead of decoding the full resolution first
+                image.draft('RGB', (self.max_dimension, self.max_dimension))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            if has_alpha and self.image_format == 'WEBP':
+                image = image.convert('RGBA')
+            elif has_alpha:
+                rgba = image.convert('RGBA')
+                image = Image.new('RGB', rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel('A'))
+            elif image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(target, format=self.image_format, quality=self.quality, optimize=True)
+
+
+def prune_cache(cache_dir, max_age_days):
+    """Remove processed images not used for `max_age_days`, return how many were removed"""
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return 0
+    limit = time.time() - max_age_days * 86400
+    removed = 0
+    for entry in os.scandir(cache_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < limit:
+                os.remove(entry.path)
+                removed += 1
+        except OSError as e:
+            _logger.warning(f"Could not remove cached image {entry.path}: {e}")
+    return removed
+
+
+class ImageExportPipeline:
+    """Download source images and upload them to PrestaShop through two overlapping worker pools.
+
+    At most `max_pending` images are held between the download and the upload
+    stage: when uploads fall behind, new downloads wait (back-pressure).
+
+    Downloads are streamed into a temporary file that stays in memory up to
+    `spool_threshold` bytes and moves to disk above it, and uploads stream from
+    that file, so a worker never holds more than max_pending * spool_threshold
+    bytes of image data whatever the size of the source images.
+
+    With a `normalizer`, images that have to be uploaded are downsized and
+    re-encoded first; reuse checks still use the hash of the source content.
+
+    Each task is a dict with `url`, `ps_product_id` and `filename`, plus optionally
+    `known` (what was stored for this URL: image_id, etag, last_modified) and
+    `known_hashes` ({content hash: image_id} already on the PrestaShop product).
+    Unchanged sources (304) and already-uploaded content are not uploaded again.
+
+    Results come back in task order as dicts with `image_id`, `error`, `size`,
+    `reused`, `content_hash`, `etag` and `last_modified`.
+    """
+
+    def __init__(self, client, download_workers=4, upload_workers=2, max_pending=8,
+                 spool_threshold=DEFAULT_SPOOL_THRESHOLD, normalizer=None):
+        self.client = client
+        self.normalizer = normalizer
+        self.download_workers = max(download_workers, 1)
+        self.upload_workers = max(upload_workers, 1)
+        self.max_pending = max(max_pending, 1)
+        self.spool_threshold = max(spool_threshold, 1)
+        self.download_session = _get_download_session(self.download_workers)
+
+    def run(self, tasks):
+        results = [None] * len(tasks)
+        if not tasks:
+            return results
+
+        started = time.monotonic()
+        pending = threading.BoundedSemaphore(self.max_pending)
+
+        with ThreadPoolExecutor(self.upload_workers) as uploads, \
+                ThreadPoolExecutor(self.download_workers) as downloads:
+
+            def _upload_stage(index, task, download):
+                try:
+                    results[index] = dict(self._upload(task, download), **self._source_info(download))
+                except Exception as e:
+                    results[index] = {'image_id': None, 'error': f"upload error {e}", 'size': download['size']}
+                finally:
+                    self._close(download)
+                    pending.release()
+
+            def _download_stage(index, task):
+                download = None
+                try:
+                    download = self._download(task)
+                    reused = self._reuse(task, download)
+                    if not reused and self.normalizer:
+                        self.normalizer.process(download)
+                except Exception as e:
+                    self._close(download)
+                    results[index] = {'image_id': None, 'error': f"download error {e}", 'size': 0}
+                    pending.release()
+                    return None
+                if reused:
+                    results[index] = reused
+                    self._close(download)
+                    pending.release()
+                    return None
+                return uploads.submit(_upload_stage, index, task, download)
+
+            download_futures = []
+            for index, task in enumerate(tasks):
+                pending.acquire()
+                download_futures.append(downloads.submit(_download_stage, index, task))
+
+            for future in download_futures:
+                upload_future = future.result()
+                if upload_future is not None:
+                    upload_future.result()
+
+        self._log_throughput(results, time.monotonic() - started)
+        return results
+
+    def _download(self, task):
+        """Stream the source into a spooled file, conditionally when validators are known; file is None on 304"""
+        known = task.get('known') or {}
+        headers = {}
+        if known.get('image_id'):
+            if known.get('etag'):
+                headers['If-None-Match'] = known['etag']
+            if known.get('last_modified'):
+                headers['If-Modified-Since'] = known['last_modified']
+
+        with self.download_session.get(task['url'], headers=headers, timeout=DOWNLOAD_TIMEOUT,
+                                       stream=True) as response:
+            if response.status_code == 304:
+                return {'file': None, 'size': 0, 'content_hash': known.get('content_hash'),
+                        'etag': known.get('etag'), 'last_modified': known.get('last_modified')}
+            if response.status_code != 200:
+                raise ValueError(f"status {response.status_code} for {task['url']}")
+
+            spool = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    spool.write(chunk)
+                    size += len(chunk)
+            except Exception:
+                spool.close()
+                raise
+            spool.seek(0)
+
+            return {
+                'file': spool,
+                'size': size,
+                'content_hash': digest.hexdigest(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+
+    def _close(self, download):
+        if download and download['file'] is not None:
+            download['file'].close()
+
+    def _reuse(self, task, download):
+        """Result pointing at an image already on PrestaShop, or None when an upload is needed"""
+        known = task.get('known') or {}
+        if download['file'] is None:
+            image_id = known.get('image_id')
+        else:
+            image_id = (task.get('known_hashes') or {}).get(download['content_hash'])
+        if not image_id:
+            return None
+        return dict({'image_id': image_id, 'error': None, 'size': download['size'], 'reused': True},
+                    **self._source_info(download))
+
+    def _source_info(self, download):
+        return {
+            'content_hash': download['content_hash'],
+            'etag': download['etag'],
+            'last_modified': download['last_modified'],
+        }
+
+    def _upload(self, task, download):
+        size = download['size']
+        filename = task['filename']
+        if download.get('extension'):
+            filename = f"{os.path.splitext(filename)[0]}.{download['extension']}"
+        body = MultipartFileStream('image', filename, download['file'], size,
+                                   content_type=download.get('content_type', 'image/jpeg'))
+        response = self.client.post(
+            f"images/products/{task['ps_product_id']}",
+            data=body,
+            headers={'Content-Type': body.content_type},
+            timeout=UPLOAD_TIMEOUT
+        )
+        if response.status_code not in (200, 201):
+            return {'image_id': None, 'error': f"upload failed {response.status_code}", 'size': size}
+
+        image_id = ET.fromstring(response.content).findtext('.//image/id')
+        if not image_id:
+            return {'image_id': None, 'error': "no image id in upload response", 'size': size}
+        return {'image_id': int(image_id), 'error': None, 'size': size, 'reused': False}
+
+    def _log_throughput(self, results, elapsed):
+        done = [r for r in results if r and r['image_id'] and not r.get('reused')]
+        reused = [r for r in results if r and r.get('reused')]
+        size_mb = sum(r['size'] for r in results if r) / (1024 * 1024)
+        elapsed = max(elapsed, 0.001)
+        _logger.info(
+            f"Image pipeline: {len(done)}/{len(results)} image(s) uploaded, {len(reused)} reused, {size_mb:.1f} MB "
+            f"in {elapsed:.1f}s ({len(done) / elapsed:.2f} img/s, {size_mb / elapsed:.2f} MB/s)"
+        )
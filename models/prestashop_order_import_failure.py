@@ -0,0 +1,34 @@
+from odoo import models, fields, api
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class PrestashopOrderImportFailure(models.Model):
+    _name = 'prestashop.order.import.failure'
+    _description = 'PrestaShop order that failed to import'
+    _rec_name = 'ps_order_id'
+
+    ps_order_id = fields.Char(string="PrestaShop Order ID", required=True, index=True)
+    attempts = fields.Integer(string="Attempts", default=0)
+    last_attempt = fields.Datetime(string="Last Attempt")
+    skipped = fields.Boolean(string="Skipped", help="Given up after prestashop.order_import.max_attempts")
+
+    _sql_constraints = [
+        ('ps_order_id_uniq', 'unique(ps_order_id)', 'One failure counter per PrestaShop order.'),
+    ]
+
+    @api.model
+    def _record(self, ps_order_id):
+        """Count one more failed import of an order, return its counter"""
+        record = self.search([('ps_order_id', '=', ps_order_id)], limit=1)
+        if record:
+            record.write({'attempts': record.attempts + 1, 'last_attempt': fields.Datetime.now()})
+        else:
+            record = self.create({'ps_order_id': ps_order_id, 'attempts': 1, 'last_attempt': fields.Datetime.now()})
+        return record
+
+    @api.model
+    def _clear(self, ps_order_ids):
+        """Forget the counters of orders that are imported now"""
+        if ps_order_ids:
+            self.search([('ps_order_id', 'in', list(ps_order_ids))]).unlink()
@@ -1,16 +1,141 @@
 from odoo import models, fields, api,_
 from odoo.exceptions import UserError
+from odoo.tools import config
+from odoo.addons.queue_job.job import identity_exact
+from odoo.addons.queue_job.exception import RetryableJobError
 import requests
-import base64
 from datetime import datetime, timedelta
 import time
 import json
+import os
 import xml.etree.ElementTree as ET
 from lxml import etree
 import logging
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from .prestashop_client import get_prestashop_client
+from .prestashop_images import ImageExportPipeline, ImageNormalizer, prune_cache
+from .prestashop_batching import AdaptiveBatcher
+from .prestashop_resource_cache import memory_cache_get, memory_cache_set, cached_fields_display, strip_node
 _logger = logging.getLogger(__name__)
 
+# Max ids per filter[...]=[a|b|c] list query, keeps URLs well under server limits
+PS_FILTER_CHUNK_SIZE = 50
+
+
+def chunked(items, size):
+    """Split a list into consecutive slices of at most `size` items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def run_concurrently(func, items, workers):
+    """Return [func(item)] in order, computed by at most `workers` threads doing HTTP only (no ORM)"""
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def list_filtered(client, resource, field, values, params=None, workers=1, timeout=60):
+    """Parsed roots of GET resource?filter[field]=[a|b|c] list queries over values, failed chunks left out"""
+    return list_filtered_many(client, [(resource, field, values, params)], workers, timeout)[0]
+
+
+def list_filtered_many(client, queries, workers=1, timeout=60):
+    """list_filtered for several (resource, field, values, params) queries, their chunks sharing one pool"""
+    jobs = [
+        (index, resource, field, chunk, params or {})
+        for index, (resource, field, values, params) in enumerate(queries)
+        for chunk in chunked(list(values), PS_FILTER_CHUNK_SIZE)
+    ]
+
+    def _fetch(job):
+        _index, resource, field, chunk, params = job
+        try:
+            resp = client.get(resource, params=dict(params, **{
+                f'filter[{field}]': f"[{'|'.join(chunk)}]",
+            }), timeout=timeout)
+            if resp.status_code != 200:
+                _logger.warning(f"GET {resource} failed | Status: {resp.status_code}")
+                return None
+            return ET.fromstring(resp.content)
+        except Exception as e:
+            _logger.warning(f"Exception while listing {resource}: {e}")
+            return None
+
+    roots = [[] for _query in queries]
+    for job, root in zip(jobs, run_concurrently(_fetch, jobs, workers)):
+        if root is not None:
+            roots[job[0]].append(root)
+    return roots
+
+
+# PrestaShop country id -> res.country id, per database, shared by every cursor of the process
+_COUNTRY_IDS = {}
+_COUNTRY_IDS_LOCK = threading.Lock()
+COUNTRY_REFRESH_SECONDS = 3600
+
+
+def try_job_lock(cr, name):
+    """Take a transaction-level advisory lock, False when another transaction holds it
+
+    Jobs take it first: identity_key only dedupes pending jobs, not one already started.
+    """
+    cr.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (name,))
+    return cr.fetchone()[0]
+
+
+def export_queue_cutoff(env):
+    """Records queued for export after this date still have a pending or running job"""
+    minutes = int(env['ir.config_parameter'].sudo().get_param('prestashop.export_queue_ttl_minutes', 60))
+    return fields.Datetime.now() - timedelta(minutes=minutes)
+
+
+class ProductCategory(models.Model):
+    _inherit = "product.category"
+
+    id_prestashop = fields.Integer(
+        string='PrestaShop Category ID',
+        help='Automatically filled the first time the category is resolved during product export',
+        copy=False,
+        readonly=True
+    )
+    id_prestashop_parent = fields.Integer(
+        string='PrestaShop Parent Category ID',
+        help='PrestaShop parent the category ID above was resolved under',
+        copy=False,
+        readonly=True
+    )
+
+
+class PrestashopManufacturer(models.Model):
+    _name = 'prestashop.manufacturer'
+    _description = 'PrestaShop manufacturer ID by brand name'
+
+    name = fields.Char(string="Marque", required=True, index=True)
+    id_prestashop = fields.Integer(string="PrestaShop Manufacturer ID", required=True)
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'A brand can only be mapped once.'),
+    ]
+
+    @api.model
+    def _store(self, name_to_id):
+        """Create or update the brand -> PrestaShop id rows"""
+        existing = {m.name: m for m in self.search([('name', 'in', list(name_to_id))])}
+        to_create = []
+        for name, ps_id in name_to_id.items():
+            record = existing.get(name)
+            if not record:
+                to_create.append({'name': name, 'id_prestashop': ps_id})
+            elif record.id_prestashop != ps_id:
+                record.id_prestashop = ps_id
+        if to_create:
+            self.create(to_create)
+
 
 class ProductTemplate(models.Model):
     _inherit = "product.template"
@@ -21,12 +146,17 @@ class ProductTemplate(models.Model):
         copy=False,
         readonly=True
     )
+    prestashop_export_queued_at = fields.Datetime(
+        string='PrestaShop Export Queued At',
+        help='Set while an export job is pending for this product, cleared when the job is done',
+        copy=False,
+        readonly=True
+    )
     def _delete_product_from_prestashop(self, id_prestashop):
         """Delete a single product from PrestaShop by ID"""
         try:
-            response = requests.delete(
-                f"https://outletna.com/api/products/{id_prestashop}",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).delete(
+                f"products/{id_prestashop}",
                 timeout=60
             )
 
@@ -110,16 +240,57 @@ class ProductTemplate(models.Model):
             }
         }
 
-    def _get_or_create_prestashop_manufacturer(self, manufacturer_name):
+    def _warm_manufacturer_cache(self, export_cache):
+        """Load every PrestaShop manufacturer with one listing, keep it for the job and in Odoo"""
+        manufacturer_cache = export_cache.setdefault('manufacturers', {})
+        Manufacturer = self.env['prestashop.manufacturer'].sudo()
+
+        # Persisted ids first, so a failed listing still leaves a usable cache
+        for manufacturer in Manufacturer.search([]):
+            manufacturer_cache[manufacturer.name] = manufacturer.id_prestashop
+
+        try:
+            response = get_prestashop_client(self.env).get(
+                "manufacturers",
+                params={'display': '[id,name]'},
+                timeout=60
+            )
+            if response.status_code != 200:
+                _logger.warning(f"Failed to list manufacturers: {response.status_code}")
+                return manufacturer_cache
+
+            listed = {}
+            for manufacturer in ET.fromstring(response.content).findall('.//manufacturer'):
+                name = manufacturer.findtext('name')
+                manuf_id = manufacturer.findtext('id')
+                if name and manuf_id:
+                    listed[name] = int(manuf_id)
+
+            manufacturer_cache.update(listed)
+            Manufacturer._store(listed)
+        except Exception as e:
+            _logger.error(f"Error listing manufacturers: {str(e)}")
+        return manufacturer_cache
+
+    def _get_or_create_prestashop_manufacturer(self, manufacturer_name, export_cache=None):
         """Get or create PrestaShop manufacturer by name"""
         if not manufacturer_name:
             return 0
 
+        if export_cache is not None:
+            manufacturer_cache = export_cache.setdefault('manufacturers', {})
+            if manufacturer_name not in manufacturer_cache:
+                manufacturer_cache[manufacturer_name] = self._get_or_create_prestashop_manufacturer(manufacturer_name)
+                if manufacturer_cache[manufacturer_name]:
+                    self.env['prestashop.manufacturer'].sudo()._store(
+                        {manufacturer_name: manufacturer_cache[manufacturer_name]}
+                    )
+            return manufacturer_cache[manufacturer_name]
+
         try:
             # Search for existing manufacturer
-            response = requests.get(
-                "https://outletna.com/api/manufacturers",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).get(
+                "manufacturers",
                 params={'filter[name]': manufacturer_name, 'display': 'full'},
                 timeout=30
             )
@@ -153,9 +324,8 @@ class ProductTemplate(models.Model):
     </prestashop>"""
 
             try:
-                response = requests.post(
-                    "https://outletna.com/api/manufacturers",
-                    auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+                response = get_prestashop_client(self.env).post(
+                    "manufacturers",
                     headers={"Content-Type": "application/xml"},
                     data=xml_data.encode('utf-8'),
                     timeout=30
@@ -179,9 +349,8 @@ class ProductTemplate(models.Model):
         """Get or create PrestaShop category by name"""
         try:
             # Search for existing category
-            response = requests.get(
-                "https://outletna.com/api/categories",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).get(
+                "categories",
                 params={'filter[name]': category_name, 'display': 'full'},
                 timeout=30
             )
@@ -226,9 +395,8 @@ class ProductTemplate(models.Model):
 </prestashop>"""
 
         try:
-            response = requests.post(
-                "https://outletna.com/api/categories",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).post(
+                "categories",
                 headers={"Content-Type": "application/xml"},
                 data=xml_data.encode('utf-8'),
                 timeout=30
@@ -275,8 +443,12 @@ class ProductTemplate(models.Model):
 
         return category_ids
     '''
-    def _get_product_categories(self):
-        """Get all categories from Odoo product with correct parent hierarchy"""
+    def _get_product_categories(self, export_cache=None):
+        """Get all categories from Odoo product with correct parent hierarchy, through export_cache"""
+        if export_cache is None:
+            export_cache = {}
+        category_cache = export_cache.setdefault('categories', {})
+
         if not self.categ_id:
             return [2]  # Default to Home category
 
@@ -296,23 +468,35 @@ class ProductTemplate(models.Model):
         category_ids = [2]
 
         for odoo_category in hierarchy:
-            ps_id = self._get_or_create_prestashop_category(
-                odoo_category.name,
-                parent_id=parent_ps_id  # each level gets the previous level as parent
-            )
+            key = (odoo_category.id, parent_ps_id)
+            if key in category_cache:
+                ps_id = category_cache[key]
+            elif odoo_category.id_prestashop and odoo_category.id_prestashop_parent == parent_ps_id:
+                ps_id = category_cache[key] = odoo_category.id_prestashop
+            else:
+                ps_id = self._get_or_create_prestashop_category(
+                    odoo_category.name,
+                    parent_id=parent_ps_id  # each level gets the previous level as parent
+                )
+                if ps_id:
+                    category_cache[key] = ps_id
+                    odoo_category.sudo().write({
+                        'id_prestashop': ps_id,
+                        'id_prestashop_parent': parent_ps_id,
+                    })
             if ps_id and ps_id not in category_ids:
                 category_ids.append(ps_id)
             parent_ps_id = ps_id  # next level's parent = current level's PS ID
 
         return category_ids
-    def _prepare_product_xml(self, product):
+    def _prepare_product_xml(self, product, export_cache=None):
         """Prepare XML data for a single product"""
         # default brand
         manufacturer_id = 0
         if product.x_studio_marque:
-            manufacturer_id = product._get_or_create_prestashop_manufacturer(product.x_studio_marque)
+            manufacturer_id = product._get_or_create_prestashop_manufacturer(product.x_studio_marque, export_cache)
         # Get categories
-        category_ids = product._get_product_categories()
+        category_ids = product._get_product_categories(export_cache)
         default_category = category_ids[0] if category_ids else 2
 
         # Build categories XML
@@ -321,7 +505,8 @@ class ProductTemplate(models.Model):
             for cat_id in category_ids
         ])
         if manufacturer_id > 0:
-            manufacturer_xml = f'<id_manufacturer xlink:href="https://outletna.com/api/manufacturers/{manufacturer_id}"><![CDATA[{manufacturer_id}]]></id_manufacturer>'
+            manufacturer_url = get_prestashop_client(self.env).url(f"manufacturers/{manufacturer_id}")
+            manufacturer_xml = f'<id_manufacturer xlink:href="{manufacturer_url}"><![CDATA[{manufacturer_id}]]></id_manufacturer>'
         else:
             manufacturer_xml = '<id_manufacturer><![CDATA[0]]></id_manufacturer>'
         ean_value = product.barcode or ''
@@ -359,74 +544,120 @@ class ProductTemplate(models.Model):
         </associations>
       </product>"""
 
-    def _job_export_products_batch(self, product_ids):
+    def _job_export_products_batch(self, product_ids, export_cache=None):
         """Background job to export a batch of products"""
-        products = self.browse(product_ids)
+        batch = self.browse(product_ids).exists()
+        # Another job may have exported some of them in the meantime
+        products = batch.filtered(lambda p: not p.id_prestashop)
 
         if not products:
+            batch.write({'prestashop_export_queued_at': False})
             return
 
         _logger.info(f"JOB: Exporting batch of {len(products)} products...")
+        started = time.monotonic()
 
         # Build XML for all products
-        products_xml = '\n'.join([self._prepare_product_xml(p) for p in products])
-
+        # Lookups shared by every product of the batch (and by the later stages when publishing)
+        if export_cache is None:
+            export_cache = {}
+        if 'manufacturers' not in export_cache and any(products.mapped('x_studio_marque')):
+            self._warm_manufacturer_cache(export_cache)
+        fragments = {p.id: self._prepare_product_xml(p, export_cache) for p in products}
+
+        exported, failed = self._post_products_batch(get_prestashop_client(self.env), products, fragments)
+        _logger.info(f"JOB: Batch completed - Exported: {exported}, Failed: {failed}")
+        AdaptiveBatcher(self.env, 'products').record(len(products), time.monotonic() - started, failed)
+        batch.write({'prestashop_export_queued_at': False})
+
+    def _post_products_batch(self, client, products, fragments, exported_before=0):
+        """POST products in one document, return (exported count, failed count)
+
+        400/422 splits the batch in half; other errors are retried by queue_job unless products were exported.
+        """
+        products_xml = '\n'.join(fragments[p.id] for p in products)
         xml_data = f"""<?xml version="1.0" encoding="UTF-8"?>
     <prestashop xmlns:xlink="http://www.w3.org/1999/xlink">
 {products_xml}
     </prestashop>"""
 
         try:
-            response = requests.post(
-                "https://outletna.com/api/products",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = client.post(
+                "products",
                 headers={"Content-Type": "application/xml"},
                 data=xml_data.encode('utf-8'),
                 timeout=60
             )
+        except Exception as e:
+            # Connection problem, not a bad record: splitting would not help
+            _logger.error(f"JOB: Exception during batch export of {len(products)} product(s): {e}")
+            if not exported_before:
+                raise RetryableJobError(f"PrestaShop unreachable ({e}), retrying later") from e
+            return 0, len(products)
+
+        status = response.status_code
+        if status in (400, 422):
+            if len(products) == 1:
+                _logger.error(f"JOB: Export failed for {products.name}: {status} - {response.text}")
+                return 0, 1
+            half = len(products) // 2
+            _logger.warning(
+                f"JOB: Batch of {len(products)} rejected ({status}), retrying as {half} + {len(products) - half}"
+            )
+            first = self._post_products_batch(client, products[:half], fragments, exported_before)
+            second = self._post_products_batch(client, products[half:], fragments, exported_before + first[0])
+            return first[0] + second[0], first[1] + second[1]
 
-            if response.status_code in [200, 201]:
-                root = ET.fromstring(response.content)
-
-                # Parse response and map IDs back to products
-                for idx, product_elem in enumerate(root.findall('.//product')):
-                    prestashop_id_elem = product_elem.find('id')
-                    if prestashop_id_elem is not None and idx < len(products):
-                        product = products[idx]
-                        prestashop_id = int(prestashop_id_elem.text)
-                        product.id_prestashop = prestashop_id
-
-                        _logger.info(f"JOB: Exported {product.name} (ID: {prestashop_id})")
-
-                        # Post message to product
-                        category_names = []
-                        if product.categ_id:
-                            current = product.categ_id
-                            while current and current.name not in ['All', 'All / Saleable']:
-                                category_names.append(current.name)
-                                current = current.parent_id
-
-                        categories_display = ' > '.join(reversed(category_names)) if category_names else 'Home'
-
-                _logger.info(f"JOB: Batch completed successfully")
+        if status not in (200, 201):
+            _logger.error(f"JOB: Batch export of {len(products)} product(s) failed: {status} - {response.text}")
+            if (status == 429 or status >= 500) and not exported_before:
+                raise RetryableJobError(f"PrestaShop answered {status}, retrying later")
+            # 401/403 and other errors: configuration problem, retrying the same request will not help
+            return 0, len(products)
 
-            else:
-                _logger.error(f"JOB: Batch export failed: {response.status_code} - {response.text}")
+        try:
+            product_elems = ET.fromstring(response.content).findall('.//product')
+        except ET.ParseError as e:
+            # The products exist on PrestaShop by now: find their ids by reference
+            _logger.error(f"JOB: Unreadable answer to a batch export ({e}), looking the ids up by reference")
+            product_elems = self._list_products_by_reference(client, products)
+
+        # Created ids by reference, in response order for duplicated references
+        created = defaultdict(list)
+        for product_elem in product_elems:
+            reference = (product_elem.findtext('reference') or '').strip()
+            prestashop_id = (product_elem.findtext('id') or '').strip()
+            if reference and prestashop_id.isdigit():
+                created[reference].append(int(prestashop_id))
+
+        exported = 0
+        for product in products:
+            ids = created.get(str(product.x_studio_item_id).strip())
+            if not ids:
+                _logger.error(f"JOB: {product.name} ({product.x_studio_item_id}) missing from the PrestaShop response")
+                continue
+            product.id_prestashop = ids.pop(0)
+            exported += 1
+            _logger.info(f"JOB: Exported {product.name} (ID: {product.id_prestashop})")
+        return exported, len(products) - exported
 
-        except Exception as e:
-            _logger.error(f"JOB: Exception during batch export: {e}", exc_info=True)
-            raise
+    def _list_products_by_reference(self, client, products):
+        """PrestaShop product nodes (id, reference) matching the references of products"""
+        references = sorted({str(p.x_studio_item_id).strip() for p in products if p.x_studio_item_id})
+        roots = list_filtered(client, "products", 'reference', references, {'display': '[id,reference]', 'sort': '[id_ASC]'})
+        return [product_elem for root in roots for product_elem in root.findall('.//product')]
 
     def action_export_to_prestashop(self):
         """Export products in background using queue jobs"""
         if not self:
             raise UserError("No product selected.")
 
-        BATCH_SIZE = 30  # Products per job
+        BATCH_SIZE = AdaptiveBatcher(self.env, 'products').size()  # Products per job
 
         # Filter products that need export
         products_to_export = []
         skipped_count = 0
+        queued_cutoff = export_queue_cutoff(self.env)
 
         for product in self:
             if product.id_prestashop and product.id_prestashop != 0:
@@ -434,6 +665,11 @@ class ProductTemplate(models.Model):
                 _logger.info(f"Skipped: {product.name} (already exported)")
                 continue
 
+            if product.prestashop_export_queued_at and product.prestashop_export_queued_at > queued_cutoff:
+                skipped_count += 1
+                _logger.info(f"Skipped: {product.name} (export already queued)")
+                continue
+
             if not product.x_studio_item_id:
                 _logger.warning(f"Skipped: {product.name} (missing reference)")
                 skipped_count += 1
@@ -458,6 +694,7 @@ class ProductTemplate(models.Model):
         total_batches = (total_products + BATCH_SIZE - 1) // BATCH_SIZE
 
         _logger.info(f"Creating {total_batches} background jobs for {total_products} products")
+        self.browse([p.id for p in products_to_export]).write({'prestashop_export_queued_at': fields.Datetime.now()})
 
         for i in range(0, total_products, BATCH_SIZE):
             batch = products_to_export[i:i + BATCH_SIZE]
@@ -465,6 +702,9 @@ class ProductTemplate(models.Model):
 
             # Create a background job for this batch
             self.with_delay(
+                channel='root.prestashop_catalogue',
+                priority=20,
+                identity_key=identity_exact,
                 description=f"Export PrestaShop Products (Batch {(i // BATCH_SIZE) + 1}/{total_batches})"
             )._job_export_products_batch(batch_ids)
 
@@ -481,6 +721,126 @@ class ProductTemplate(models.Model):
             }
         }
 
+    def _job_publish_products(self, template_ids):
+        """Background job: publish templates end to end - product, combinations, images and stock"""
+        templates = self.browse(template_ids).exists()
+        if not templates:
+            return
+
+        Variant = self.env['product.product']
+        export_cache = {}
+        started = time.monotonic()
+        failed = 0
+        _logger.info(f"JOB: Publishing {len(templates)} product(s)...")
+
+        # Stage 1: products
+        to_export = templates.filtered(lambda t: not t.id_prestashop and t.x_studio_item_id)
+        if to_export:
+            self._job_export_products_batch(to_export.ids, export_cache)
+            failed += len(to_export.filtered(lambda t: not t.id_prestashop))
+
+        # Stage 2: combinations of the products now on PrestaShop
+        variants = templates.filtered('id_prestashop').product_variant_ids
+        new_variants = variants.filtered(
+            lambda v: not v.id_prestashop_variant and v.default_code and v.product_template_attribute_value_ids
+        )
+        if new_variants:
+            Variant._job_export_combinations_batch(new_variants.ids, export_cache)
+            failed += len(new_variants.filtered(lambda v: not v.id_prestashop_variant))
+
+        exported_variants = variants.filtered('id_prestashop_variant')
+
+        # Stage 3: images (already uploaded ones are only re-associated)
+        with_images = exported_variants.filtered('x_studio_image1')
+        if with_images:
+            try:
+                failed += with_images._export_variant_images()['failed']
+            except Exception as e:
+                _logger.error(f"JOB: Image stage failed for {with_images.ids}: {str(e)}")
+                failed += len(with_images)
+
+        # Stage 4: stock
+        if exported_variants:
+            stats = Variant._sync_stock_batch_bulk(Variant._get_stock_sync_products(exported_variants.ids))
+            failed += stats['failed']
+
+        templates.write({'prestashop_export_queued_at': False})
+        AdaptiveBatcher(self.env, 'publish').record(len(templates), time.monotonic() - started, failed)
+        _logger.info(
+            f"JOB: Published {len(templates.filtered('id_prestashop'))}/{len(templates)} product(s), "
+            f"{len(exported_variants)} combination(s)"
+        )
+
+    def action_publish_to_prestashop(self):
+        """Queue end-to-end publish jobs (product, combinations, images, stock)"""
+        if not self:
+            raise UserError("No product selected.")
+
+        BATCH_SIZE = AdaptiveBatcher(self.env, 'publish').size()  # Templates per job
+
+        queued_cutoff = export_queue_cutoff(self.env)
+        templates = self.filtered(
+            lambda t: (t.id_prestashop or t.x_studio_item_id)
+            and not (t.prestashop_export_queued_at and t.prestashop_export_queued_at > queued_cutoff)
+        )
+        if not templates:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'No Products to Publish',
+                    'message': 'Selected products have no reference or are already queued.',
+                    'type': 'warning',
+                    'sticky': False,
+                }
+            }
+
+        total_products = len(templates)
+        total_batches = (total_products + BATCH_SIZE - 1) // BATCH_SIZE
+        templates.write({'prestashop_export_queued_at': fields.Datetime.now()})
+        for i in range(0, total_products, BATCH_SIZE):
+            self.with_delay(
+                channel='root.prestashop_catalogue',
+                priority=20,
+                identity_key=identity_exact,
+                description=f"Publish PrestaShop Products (Batch {(i // BATCH_SIZE) + 1}/{total_batches})"
+            )._job_publish_products(templates[i:i + BATCH_SIZE].ids)
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Publish Started!',
+                'message': f'{total_products} products queued for publishing in {total_batches} batch(es). Check Queue Jobs menu for progress.',
+                'type': 'success',
+                'sticky': True,
+            }
+        }
+
+    def cron_publish_products_to_prestashop(self):
+        """Cron job: publish new products in one pass instead of the four staged crons"""
+        _logger.info("CRON: Starting automatic PrestaShop publish")
+        try:
+            templates = self.search([
+                '|',
+                ('id_prestashop', '=', False),
+                ('id_prestashop', '=', 0),
+                ('x_studio_item_id', '!=', False),
+                '|',
+                ('prestashop_export_queued_at', '=', False),
+                ('prestashop_export_queued_at', '<', export_queue_cutoff(self.env)),
+            ], limit=100)
+
+            if not templates:
+                _logger.info("CRON: No new products to publish")
+                return
+
+            _logger.info(f"CRON: Found {len(templates)} product(s) to publish")
+            templates.action_publish_to_prestashop()
+
+        except Exception as e:
+            _logger.error(f"CRON ERROR: {str(e)}")
+
     def cron_export_new_products_to_prestashop(self):
         """Cron job: Export new products using queue jobs"""
         _logger.info("CRON: Starting automatic PrestaShop export")
@@ -491,6 +851,9 @@ class ProductTemplate(models.Model):
                 ('id_prestashop', '=', False),
                 ('id_prestashop', '=', 0),
                 ('x_studio_item_id', '!=', False),
+                '|',
+                ('prestashop_export_queued_at', '=', False),
+                ('prestashop_export_queued_at', '<', export_queue_cutoff(self.env)),
             ], limit=100)
 
             if not products_to_export:
@@ -513,6 +876,12 @@ class ProductProductPrest(models.Model):
         copy=False,
         readonly=True
     )
+    prestashop_export_queued_at = fields.Datetime(
+        string='PrestaShop Export Queued At',
+        help='Set while an export job is pending for this variant, cleared when the job is done',
+        copy=False,
+        readonly=True
+    )
 
     def action_export_variant_images(self):
         """Export images for multiple variant/combination to PrestaShop"""
@@ -520,9 +889,38 @@ class ProductProductPrest(models.Model):
         if not self:
             raise UserError("No variant selected.")
 
+        stats = self._export_variant_images()
+        message = f"Total Uploaded: {stats['uploaded']}\n Total Reused: {stats['reused']}\n Total Failed: {stats['failed']}"
+        if stats['associated_ids']:
+            message += f"\n Associated Image IDs: {', '.join(map(str, stats['associated_ids']))}"
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Variant Image Export',
+                'message': message,
+                'type': 'success' if stats['failed'] == 0 else 'warning',
+                'sticky': True,
+            }
+        }
+
+    def _export_variant_images(self):
+        """Upload and associate the images of these variants, return the counts"""
         total_uploaded = 0
+        total_reused = 0
         total_failed = 0
         all_associated_ids = []
+        variants_to_export = self.browse()
+        tasks = []
+        task_index = {}  # (ps_product_id, url) -> task, one download per image of a PrestaShop product
+        variant_tasks = defaultdict(list)
+
+        ImageStore = self.env['prestashop.variant.image'].sudo()
+        known_by_url, known_by_hash = ImageStore._get_known_images(
+            set(self.mapped('product_tmpl_id.id_prestashop')) - {0}
+        )
+        self._drop_deleted_known_images(known_by_url, known_by_hash)
 
         for variant in self:
             # Validation 1: Check combination ID
@@ -549,95 +947,210 @@ class ProductProductPrest(models.Model):
                 total_failed += 1
                 continue
 
-            uploaded_image_ids = []
-            uploaded_count = 0
-            failed_count = 0
-
-            # Upload images
+            variants_to_export |= variant
+            ps_product_id = variant.product_tmpl_id.id_prestashop
             for idx, image_url in enumerate(image_urls, 1):
-                try:
-                    response = requests.get(image_url, timeout=30)
-                    if response.status_code != 200:
-                        _logger.error(f"{variant.display_name}: failed to download {image_url}")
-                        failed_count += 1
-                        continue
+                key = (ps_product_id, image_url)
+                if key not in task_index:
+                    task_index[key] = len(tasks)
+                    tasks.append({
+                        'url': image_url,
+                        'ps_product_id': ps_product_id,
+                        'filename': f'variant_{variant.id_prestashop_variant}_{idx}.jpg',
+                        'known': known_by_url.get(key),
+                        'known_hashes': known_by_hash.get(ps_product_id, {}),
+                    })
+                variant_tasks[variant.id].append(task_index[key])
 
-                    image_data = response.content
-                    files = {'image': (f'variant_{variant.id_prestashop_variant}_{idx}.jpg', image_data, 'image/jpeg')}
-                    upload_response = requests.post(
-                        f"https://outletna.com/api/images/products/{variant.product_tmpl_id.id_prestashop}",
-                        auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
-                        files=files,
-                        timeout=60
-                    )
+        # Download and upload every image of the selection through the pipeline
+        results = self._get_image_pipeline().run(tasks)
 
-                    if upload_response.status_code in [200, 201]:
-                        root = ET.fromstring(upload_response.content)
-                        image_id_elem = root.find('.//image/id')
-                        if image_id_elem is not None:
-                            image_id = int(image_id_elem.text)
-                            uploaded_image_ids.append(image_id)
-                            uploaded_count += 1
-                    else:
-                        _logger.error(f"{variant.display_name}: upload failed {upload_response.status_code}")
-                        failed_count += 1
-                except Exception as e:
-                    _logger.error(f"{variant.display_name}: error {str(e)}")
-                    failed_count += 1
+        for task, result in zip(tasks, results):
+            if not result['image_id']:
+                _logger.error(f"Image export failed: {result['error']} ({task['url']})")
+                total_failed += 1
+                continue
+            if result.get('reused'):
+                total_reused += 1
+            else:
+                total_uploaded += 1
+            ImageStore._store(task['ps_product_id'], task['url'], {
+                'image_id': result['image_id'],
+                'content_hash': result['content_hash'],
+                'etag': result['etag'],
+                'last_modified': result['last_modified'],
+            })
+
+        # Associate images with variants in one pass, including variants whose images were all there already
+        images_by_combination = {}
+        for variant in variants_to_export:
+            image_ids = [results[i]['image_id'] for i in variant_tasks[variant.id] if results[i]['image_id']]
+            if image_ids:
+                images_by_combination[str(variant.id_prestashop_variant)] = image_ids
+        associated = self._associate_combinations_images(images_by_combination)
+        for combination_id in associated:
+            all_associated_ids.extend(images_by_combination[combination_id])
+
+        return {
+            'uploaded': total_uploaded,
+            'reused': total_reused,
+            'failed': total_failed,
+            'associated_ids': all_associated_ids,
+        }
 
-            # Associate images with variant
-            if uploaded_image_ids:
+    def _drop_deleted_known_images(self, known_by_url, known_by_hash):
+        """Forget stored images whose id is no longer among the PrestaShop product's images"""
+        ps_product_ids = {ps_product_id for ps_product_id, _url in known_by_url}
+        if not ps_product_ids:
+            return
+
+        live_images = self._get_product_image_ids(get_prestashop_client(self.env), ps_product_ids)
+        stale = []
+        for (ps_product_id, url), vals in list(known_by_url.items()):
+            # Products the listing did not return are left alone
+            if ps_product_id not in live_images or vals['image_id'] in live_images[ps_product_id]:
+                continue
+            stale.append((ps_product_id, url))
+            del known_by_url[(ps_product_id, url)]
+            hashes = known_by_hash.get(ps_product_id, {})
+            if hashes.get(vals['content_hash']) == vals['image_id']:
+                del hashes[vals['content_hash']]
+
+        if stale:
+            _logger.info(f"{len(stale)} stored image(s) deleted on PrestaShop, they will be uploaded again")
+            self.env['prestashop.variant.image'].sudo()._forget(stale)
+
+    @api.model
+    def _get_product_image_ids(self, client, ps_product_ids):
+        """Return {ps_product_id: set of image ids} from products?filter[id]=[a|b|c]&display=full"""
+        image_ids = {}
+        for root in list_filtered(client, "products", 'id', sorted(str(i) for i in ps_product_ids), {'display': 'full'}):
+            for product in root.findall('./products/product'):
+                product_id = (product.findtext('id') or '').strip()
+                if product_id.isdigit():
+                    image_ids[int(product_id)] = {
+                        int(node.text) for node in product.findall('./associations/images/image/id')
+                        if node.text and node.text.strip().isdigit()
+                    }
+        return image_ids
+
+    def _get_image_cache_dir(self):
+        return os.path.join(config.filestore(self.env.cr.dbname), 'prestashop_images')
+
+    @api.model
+    def cron_prune_prestashop_image_cache(self):
+        """Cron job: delete normalised images not used for prestashop.image_cache_days days"""
+        days = int(self.env['ir.config_parameter'].sudo().get_param('prestashop.image_cache_days', 30))
+        removed = prune_cache(self._get_image_cache_dir(), days)
+        _logger.info(f"CRON: Removed {removed} cached image(s) older than {days} day(s)")
+
+    def _get_image_pipeline(self):
+        """Image pipeline configured from the prestashop.image_* system parameters"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        spool_threshold = int(ICP.get_param('prestashop.image_spool_threshold', 1024 * 1024))
+
+        normalizer = None
+        if ICP.get_param('prestashop.image_normalize', 'False') == 'True':
+            normalizer = ImageNormalizer(
+                max_dimension=int(ICP.get_param('prestashop.image_max_dimension', 2000)),
+                quality=int(ICP.get_param('prestashop.image_quality', 85)),
+                image_format=ICP.get_param('prestashop.image_format', 'JPEG'),
+                cache_dir=self._get_image_cache_dir(),
+                spool_threshold=spool_threshold,
+            )
+
+        return ImageExportPipeline(
+            get_prestashop_client(self.env),
+            download_workers=int(ICP.get_param('prestashop.image_download_workers', 4)),
+            upload_workers=int(ICP.get_param('prestashop.image_upload_workers', 2)),
+            max_pending=int(ICP.get_param('prestashop.image_max_pending', 8)),
+            spool_threshold=spool_threshold,
+            normalizer=normalizer,
+        )
+
+    @api.model
+    def _associate_combinations_images(self, images_by_combination):
+        """Set {combination id: image ids}, return the combination ids that were updated
+
+        PATCH with prestashop.supports_patch, otherwise list and PUT back only the changed ones.
+        """
+        if not images_by_combination:
+            return set()
+
+        client = get_prestashop_client(self.env)
+        if self.env['ir.config_parameter'].sudo().get_param('prestashop.supports_patch', 'False') == 'True':
+            return self._patch_combinations_images(client, images_by_combination)
+
+        associated = set()
+        for root in list_filtered(client, "combinations", 'id', list(images_by_combination), {'display': 'full'}):
+            for combination in root.findall('.//combination'):
+                combination_id = (combination.findtext('id') or '').strip()
+                image_ids = images_by_combination.get(combination_id)
+                if not image_ids:
+                    continue
+
+                associations = combination.find('associations')
+                if associations is None:
+                    associations = ET.SubElement(combination, 'associations')
+                old_images = associations.find('images')
+                current_ids = []
+                if old_images is not None:
+                    current_ids = [(node.findtext('id') or '').strip() for node in old_images.findall('image')]
+                    associations.remove(old_images)
+                if current_ids == [str(img_id) for img_id in image_ids]:
+                    associated.add(combination_id)
+                    continue
+
+                images_elem = ET.SubElement(associations, 'images')
+                for img_id in image_ids:
+                    image_elem = ET.SubElement(images_elem, 'image')
+                    ET.SubElement(image_elem, 'id').text = str(img_id)
+
+                prestashop = ET.Element('prestashop')
+                prestashop.append(combination)
                 try:
-                    get_response = requests.get(
-                        f"https://outletna.com/api/combinations/{variant.id_prestashop_variant}",
-                        auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
-                        params={'display': 'full'},
+                    update_response = client.put(
+                        f"combinations/{combination_id}",
+                        headers={"Content-Type": "application/xml"},
+                        data=ET.tostring(prestashop, encoding='utf-8', method='xml'),
                         timeout=30
                     )
-                    if get_response.status_code == 200:
-                        root = ET.fromstring(get_response.content)
-                        combination = root.find('.//combination')
-                        associations = combination.find('associations')
-                        if associations is None:
-                            associations = ET.SubElement(combination, 'associations')
-                        old_images = associations.find('images')
-                        if old_images is not None:
-                            associations.remove(old_images)
-                        images_elem = ET.SubElement(associations, 'images')
-                        for img_id in uploaded_image_ids:
-                            image_elem = ET.SubElement(images_elem, 'image')
-                            id_elem = ET.SubElement(image_elem, 'id')
-                            id_elem.text = str(img_id)
-                        updated_xml = ET.tostring(root, encoding='utf-8', method='xml')
-                        update_response = requests.put(
-                            f"https://outletna.com/api/combinations/{variant.id_prestashop_variant}",
-                            auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
-                            headers={"Content-Type": "application/xml"},
-                            data=updated_xml,
-                            timeout=30
-                        )
-                        if update_response.status_code == 200:
-                            all_associated_ids.extend(uploaded_image_ids)
                 except Exception as e:
-                    _logger.error(f"{variant.display_name}: failed to associate images: {str(e)}")
-
-            total_uploaded += uploaded_count
-            total_failed += failed_count
-
-        message = f"Total Uploaded: {total_uploaded}\n Total Failed: {total_failed}"
-        if all_associated_ids:
-            message += f"\n Associated Image IDs: {', '.join(map(str, all_associated_ids))}"
+                    _logger.error(f"Combination {combination_id}: failed to associate images: {str(e)}")
+                    continue
+                if update_response.status_code == 200:
+                    associated.add(combination_id)
+                else:
+                    _logger.error(f"Combination {combination_id}: image association failed | Status: {update_response.status_code}")
+        return associated
 
-        return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': 'Variant Image Export',
-                'message': message,
-                'type': 'success' if total_failed == 0 else 'warning',
-                'sticky': True,
-            }
-        }
+    @api.model
+    def _patch_combinations_images(self, client, images_by_combination):
+        """PATCH only the images association of each combination"""
+        associated = set()
+        for combination_id, image_ids in images_by_combination.items():
+            prestashop = ET.Element('prestashop')
+            combination = ET.SubElement(prestashop, 'combination')
+            ET.SubElement(combination, 'id').text = combination_id
+            images_elem = ET.SubElement(ET.SubElement(combination, 'associations'), 'images')
+            for img_id in image_ids:
+                image_elem = ET.SubElement(images_elem, 'image')
+                ET.SubElement(image_elem, 'id').text = str(img_id)
+            try:
+                response = client.patch(
+                    f"combinations/{combination_id}",
+                    headers={"Content-Type": "application/xml"},
+                    data=ET.tostring(prestashop, encoding='utf-8', method='xml'),
+                    timeout=30
+                )
+            except Exception as e:
+                _logger.error(f"Combination {combination_id}: failed to associate images: {str(e)}")
+                continue
+            if response.status_code == 200:
+                associated.add(combination_id)
+            else:
+                _logger.error(f"Combination {combination_id}: image association failed | Status: {response.status_code}")
+        return associated
 
     def _job_export_variant_images_batch(self, variant_ids):
         """Background job to export images for a batch of variants"""
@@ -645,20 +1158,25 @@ class ProductProductPrest(models.Model):
         if not variants:
             return
 
-        for variant in variants:
-            try:
-                variant.action_export_variant_images()
-            except Exception as e:
-                _logger.error(f"JOB: Failed to export images for {variant.display_name}: {str(e)}")
+        # One call for the whole batch so downloads and uploads overlap across variants
+        started = time.monotonic()
+        failed = 0
+        try:
+            # Failed images (and skipped variants), capped so the rate stays per variant
+            failed = min(variants._export_variant_images()['failed'], len(variants))
+        except Exception as e:
+            failed = len(variants)
+            _logger.error(f"JOB: Failed to export images for batch {variant_ids}: {str(e)}")
 
         _logger.info(f"JOB: Batch completed for {len(variants)} variant(s)")
+        AdaptiveBatcher(self.env, 'images').record(len(variants), time.monotonic() - started, failed)
 
     def action_export_variant_images_batch(self):
         """Queue jobs to export variant images for multiple products"""
         if not self:
             raise UserError(_("No variant selected."))
 
-        BATCH_SIZE = 20  # Adjust batch size as needed
+        BATCH_SIZE = AdaptiveBatcher(self.env, 'images').size()  # Variants per job
         variants_to_export = []
 
         for variant in self:
@@ -690,6 +1208,9 @@ class ProductProductPrest(models.Model):
             batch = variants_to_export[i:i + BATCH_SIZE]
             batch_ids = [v.id for v in batch]
             self.with_delay(
+                channel='root.prestashop_images',
+                priority=30,
+                identity_key=identity_exact,
                 description=f"Export PrestaShop Variant Images (Batch {(i // BATCH_SIZE) + 1}/{total_batches})"
             )._job_export_variant_images_batch(batch_ids)
 
@@ -727,9 +1248,8 @@ class ProductProductPrest(models.Model):
     def _delete_combination_from_prestashop(self, id_prestashop_variant):
         """Delete a single combination from PrestaShop by ID"""
         try:
-            response = requests.delete(
-                f"https://outletna.com/api/combinations/{id_prestashop_variant}",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).delete(
+                f"combinations/{id_prestashop_variant}",
                 timeout=60
             )
 
@@ -813,12 +1333,55 @@ class ProductProductPrest(models.Model):
             }
         }
 
-    def _get_prestashop_attribute_id(self, attribute_name):
+    def _load_attribute_cache(self, export_cache):
+        """Load all attribute groups and values once into name -> id maps for the whole batch"""
+        client = get_prestashop_client(self.env)
+        try:
+            groups_response = client.get(
+                "product_options", params={'display': '[id,name]'}, timeout=300
+            )
+            values_response = client.get(
+                "product_option_values", params={'display': '[id,id_attribute_group,name]'}, timeout=300
+            )
+            if groups_response.status_code != 200 or values_response.status_code != 200:
+                _logger.warning(
+                    f"Failed to preload attributes: {groups_response.status_code} / {values_response.status_code}"
+                )
+                return False
+
+            attribute_groups = {}
+            for group in ET.fromstring(groups_response.content).findall('.//product_option'):
+                group_id = int(group.findtext('id'))
+                for language in group.findall('./name/language'):
+                    if language.text:
+                        attribute_groups.setdefault(language.text, group_id)
+
+            attribute_values = defaultdict(dict)
+            for value in ET.fromstring(values_response.content).findall('.//product_option_value'):
+                name_elem = value.find('./name/language')
+                group_id = value.findtext('id_attribute_group')
+                if name_elem is not None and name_elem.text and group_id:
+                    attribute_values[int(group_id)].setdefault(name_elem.text, int(value.findtext('id')))
+        except Exception as e:
+            _logger.error(f"Error preloading attributes: {str(e)}")
+            return False
+
+        export_cache['attribute_groups'] = attribute_groups
+        export_cache['attribute_values'] = attribute_values
+        _logger.info(
+            f"Preloaded {len(attribute_groups)} attribute group name(s) and "
+            f"{sum(len(v) for v in attribute_values.values())} attribute value(s)"
+        )
+        return True
+
+    def _get_prestashop_attribute_id(self, attribute_name, export_cache=None):
         """Get PrestaShop attribute ID by name (Color, Size, etc.)"""
+        if export_cache and 'attribute_groups' in export_cache:
+            return export_cache['attribute_groups'].get(attribute_name)
+
         try:
-            response = requests.get(
-                "https://outletna.com/api/product_options",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).get(
+                "product_options",
                 params={'filter[name]': attribute_name, 'display': 'full'},
                 timeout=30
             )
@@ -834,13 +1397,22 @@ class ProductProductPrest(models.Model):
             _logger.error(f"Error getting attribute {attribute_name}: {str(e)}")
             return None
 
-    def _get_or_create_prestashop_attribute_value(self, attribute_id, value_name):
+    def _get_or_create_prestashop_attribute_value(self, attribute_id, value_name, export_cache=None):
         """Get or create PrestaShop attribute value ID"""
+        if export_cache and 'attribute_values' in export_cache:
+            group_values = export_cache['attribute_values'][attribute_id]
+            if value_name not in group_values:
+                value_id = self._create_prestashop_attribute_value(attribute_id, value_name)
+                if not value_id:
+                    return None
+                # Remember created values so the next variant reuses them
+                group_values[value_name] = value_id
+            return group_values[value_name]
+
         try:
             # Search for existing value
-            response = requests.get(
-                "https://outletna.com/api/product_option_values",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).get(
+                "product_option_values",
                 params={'filter[id_attribute_group]': attribute_id, 'display': 'full'},
                 timeout=300
             )
@@ -877,9 +1449,8 @@ class ProductProductPrest(models.Model):
 </prestashop>"""
 
         try:
-            response = requests.post(
-                "https://outletna.com/api/product_option_values",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).post(
+                "product_option_values",
                 headers={"Content-Type": "application/xml"},
                 data=xml_data.encode('utf-8'),
                 timeout=300
@@ -900,9 +1471,8 @@ class ProductProductPrest(models.Model):
         """Get or create PrestaShop category by name"""
         try:
             # Search for existing category
-            response = requests.get(
-                "https://outletna.com/api/categories",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).get(
+                "categories",
                 params={'filter[name]': category_name, 'display': 'full'},
                 timeout=300
             )
@@ -921,7 +1491,7 @@ class ProductProductPrest(models.Model):
             raise UserError(f"Error getting category {category_name}: {str(e)}")
 
     # ==================== HELPER METHODS ====================
-    def _prepare_combination_data(self, variant):
+    def _prepare_combination_data(self, variant, export_cache=None):
         """Prepare XML data for a single combination"""
         try:
             template = variant.product_tmpl_id
@@ -935,13 +1505,15 @@ class ProductProductPrest(models.Model):
             # Get or create attribute values in PrestaShop
             option_value_ids = []
             for attr in variant_attributes:
-                ps_attr_id = variant._get_prestashop_attribute_id(attr['prestashop_name'])
+                ps_attr_id = variant._get_prestashop_attribute_id(attr['prestashop_name'], export_cache)
 
                 if not ps_attr_id:
                     _logger.error(f"Attribute '{attr['prestashop_name']}' not found in PrestaShop")
                     return None
 
-                ps_value_id = variant._get_or_create_prestashop_attribute_value(ps_attr_id, attr['value'])
+                ps_value_id = variant._get_or_create_prestashop_attribute_value(
+                    ps_attr_id, attr['value'], export_cache
+                )
 
                 if ps_value_id:
                     option_value_ids.append(ps_value_id)
@@ -997,9 +1569,8 @@ class ProductProductPrest(models.Model):
 </prestashop>"""
 
         try:
-            response = requests.post(
-                "https://outletna.com/api/categories",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).post(
+                "categories",
                 headers={"Content-Type": "application/xml"},
                 data=xml_data.encode('utf-8'),
                 timeout=300
@@ -1068,9 +1639,8 @@ class ProductProductPrest(models.Model):
 
         # Get current product data
         try:
-            response = requests.get(
-                f"https://outletna.com/api/products/{product_id_prestashop}",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            response = get_prestashop_client(self.env).get(
+                f"products/{product_id_prestashop}",
                 params={'display': 'full'},
                 timeout=300
             )
@@ -1107,9 +1677,8 @@ class ProductProductPrest(models.Model):
             updated_xml = ET.tostring(root, encoding='utf-8', method='xml')
 
             # Update product
-            update_response = requests.put(
-                f"https://outletna.com/api/products/{product_id_prestashop}",
-                auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+            update_response = get_prestashop_client(self.env).put(
+                f"products/{product_id_prestashop}",
                 headers={"Content-Type": "application/xml"},
                 data=updated_xml,
                 timeout=300
@@ -1130,12 +1699,14 @@ class ProductProductPrest(models.Model):
         if not self:
             raise UserError("No variant selected.")
 
-        BATCH_SIZE = 30  # Variants per job
+        BATCH_SIZE = AdaptiveBatcher(self.env, 'combinations').size()  # Variants per job
 
         # Filter variants that need export
         variants_to_export = []
         skipped_count = 0
 
+        queued_cutoff = export_queue_cutoff(self.env)
+
         for variant in self:
             # Skip if already exported
             if variant.id_prestashop_variant and variant.id_prestashop_variant != 0:
@@ -1143,6 +1714,12 @@ class ProductProductPrest(models.Model):
                 _logger.info(f"Skipped: {variant.display_name} (already exported)")
                 continue
 
+            # Skip if a pending job already covers it
+            if variant.prestashop_export_queued_at and variant.prestashop_export_queued_at > queued_cutoff:
+                skipped_count += 1
+                _logger.info(f"Skipped: {variant.display_name} (export already queued)")
+                continue
+
             # Skip if missing template PrestaShop ID
             if not variant.product_tmpl_id.id_prestashop:
                 _logger.warning(f"Skipped: {variant.display_name} (missing template id_prestashop)")
@@ -1180,6 +1757,7 @@ class ProductProductPrest(models.Model):
         total_batches = (total_variants + BATCH_SIZE - 1) // BATCH_SIZE
 
         _logger.info(f"Creating {total_batches} background jobs for {total_variants} variants")
+        self.browse([v.id for v in variants_to_export]).write({'prestashop_export_queued_at': fields.Datetime.now()})
 
         for i in range(0, total_variants, BATCH_SIZE):
             batch = variants_to_export[i:i + BATCH_SIZE]
@@ -1187,6 +1765,9 @@ class ProductProductPrest(models.Model):
 
             # Create a background job for this batch
             self.with_delay(
+                channel='root.prestashop_catalogue',
+                priority=20,
+                identity_key=identity_exact,
                 description=f"Export PrestaShop Combinations (Batch {(i // BATCH_SIZE) + 1}/{total_batches})"
             )._job_export_combinations_batch(batch_ids)
 
@@ -1203,22 +1784,32 @@ class ProductProductPrest(models.Model):
             }
         }
 
-    def _job_export_combinations_batch(self, variant_ids):
+    def _job_export_combinations_batch(self, variant_ids, export_cache=None):
         """Background job to export a batch of combinations"""
-        variants = self.browse(variant_ids)
+        batch = self.browse(variant_ids).exists()
+        # Another job may have exported some of them in the meantime
+        variants = batch.filtered(lambda v: not v.id_prestashop_variant)
 
         if not variants:
+            batch.write({'prestashop_export_queued_at': False})
             return
 
         _logger.info(f"JOB: Exporting batch of {len(variants)} combinations...")
 
+        # Attribute groups and values are loaded once for the whole batch
+        if export_cache is None:
+            export_cache = {}
+        if 'attribute_groups' not in export_cache:
+            self._load_attribute_cache(export_cache)
+
+        started = time.monotonic()
         success_count = 0
         failed_count = 0
 
         for variant in variants:
             try:
                 # Prepare combination data
-                combination_data = self._prepare_combination_data(variant)
+                combination_data = self._prepare_combination_data(variant, export_cache)
 
                 if not combination_data:
                     _logger.warning(f"JOB: Skipped {variant.display_name} - no valid data")
@@ -1226,9 +1817,8 @@ class ProductProductPrest(models.Model):
                     continue
 
                 # Create combination in PrestaShop
-                response = requests.post(
-                    "https://outletna.com/api/combinations",
-                    auth=("86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N", ""),
+                response = get_prestashop_client(self.env).post(
+                    "combinations",
                     headers={"Content-Type": "application/xml"},
                     data=combination_data.encode('utf-8'),
                     timeout=60
@@ -1254,6 +1844,8 @@ class ProductProductPrest(models.Model):
                 _logger.error(f"JOB: Exception for {variant.display_name}: {str(e)}")
 
         _logger.info(f"JOB: Batch completed - Success: {success_count}, Failed: {failed_count}")
+        AdaptiveBatcher(self.env, 'combinations').record(len(variants), time.monotonic() - started, failed_count)
+        batch.write({'prestashop_export_queued_at': False})
 
     def cron_export_combinations_to_prestashop(self):
         """Cron job: Export new combinations using queue jobs"""
@@ -1266,6 +1858,9 @@ class ProductProductPrest(models.Model):
                 ('id_prestashop_variant', '=', 0),
                 ('product_tmpl_id.id_prestashop', '!=', False),
                 ('default_code', '!=', False),
+                '|',
+                ('prestashop_export_queued_at', '=', False),
+                ('prestashop_export_queued_at', '<', export_queue_cutoff(self.env)),
             ], limit=100)
 
             if not variants_to_export:
@@ -1283,22 +1878,31 @@ class ProductProductPrest(models.Model):
     @api.model
     def cron_monitor_stock_changes(self):
         """
-        Cron job function that monitors stock changes for today's date
+        Cron job function that monitors stock changes since its previous run
         This is the main entry point for the scheduled action
         """
         try:
-            _logger.info("CRON: Starting stock change monitor for today")
+            _logger.info("CRON: Starting stock change monitor")
 
-            # Monitor stock move lines from today
-            affected_products = self.get_products_from_stock_move_lines_today()
+            # Monitor stock move lines written since the stored watermark
+            affected_products, watermark = self.get_products_from_stock_move_lines_since_watermark()
 
             if affected_products:
-                _logger.info(f"CRON: Found {len(affected_products)} affected products from today, creating queue jobs")
+                _logger.info(f"CRON: Found {len(affected_products)} affected products since last run")
+
+                # Only push products whose quantity differs from the last one sent
+                affected_products, skipped = self._filter_stock_deltas(affected_products)
+                _logger.info(f"CRON: Skipped {skipped} product(s) already up to date on PrestaShop")
 
                 # Create background jobs for stock sync
-                self._create_stock_sync_jobs(affected_products)
+                if affected_products:
+                    self._create_stock_sync_jobs(affected_products)
             else:
-                _logger.info("CRON: No products affected by stock moves today")
+                _logger.info("CRON: No products affected by stock moves since last run")
+
+            # Advance only once the jobs exist, in the same transaction
+            if watermark:
+                self.env['prestashop.watermark'].sudo()._set('stock_sync', fields.Datetime.to_string(watermark))
 
         except Exception as e:
             _logger.error(f"CRON: Error in stock change monitor: {e}")
@@ -1306,11 +1910,25 @@ class ProductProductPrest(models.Model):
         _logger.info("=== CRON: Stock Change Monitor Completed ===")
         return True
 
+    @api.model
+    def _filter_stock_deltas(self, affected_products):
+        """Drop products whose fresh mappings already hold their quantity, return (to_push, skipped)"""
+        fresh = self.env['prestashop.stock.mapping']._get_fresh_mappings([p['id'] for p in affected_products])
+
+        to_push = []
+        for product_info in affected_products:
+            mappings = fresh.get(product_info['id'])
+            qty = int(product_info['qty_available'])
+            if mappings and all(m.last_pushed_qty == qty for m in mappings):
+                continue
+            to_push.append(product_info)
+        return to_push, len(affected_products) - len(to_push)
+
     # ==================== JOB CREATION ====================
     @api.model
-    def _create_stock_sync_jobs(self, affected_products):
+    def _create_stock_sync_jobs(self, affected_products, force=False):
         """Create queue jobs for stock synchronization in batches"""
-        BATCH_SIZE = 50  # Increased from 30 to 50 products per job
+        BATCH_SIZE = AdaptiveBatcher(self.env, 'stock').size()  # Products per job
 
         total_products = len(affected_products)
         total_batches = (total_products + BATCH_SIZE - 1) // BATCH_SIZE
@@ -1323,74 +1941,232 @@ class ProductProductPrest(models.Model):
 
             # Create a background job for this batch
             self.with_delay(
+                channel='root.prestashop_stock',
+                priority=5,
+                identity_key=identity_exact,
                 description=f"Sync PrestaShop Stock (Batch {(i // BATCH_SIZE) + 1}/{total_batches} - {len(batch)} products)"
-            )._job_sync_stock_batch(batch)
+            )._job_sync_stock_batch(batch, force=force)
 
         _logger.info(f"Created {total_batches} stock sync jobs with {BATCH_SIZE} products per batch")
 
     # ==================== BACKGROUND JOB METHOD ====================
     @api.model
-    def _job_sync_stock_batch(self, products_batch):
-        """Background job to sync stock for a batch of products"""
+    def _job_sync_stock_batch(self, products_batch, force=False):
+        """Background job to sync stock for a batch of products
+
+        With force=False, products whose last pushed quantity already matches are skipped.
+        """
         if not products_batch:
             return
 
         _logger.info(f"JOB: Starting stock sync for batch of {len(products_batch)} products")
+        started = time.monotonic()
 
-        BASE_URL = "https://outletna.com/api"
-        WS_KEY = "86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N"
-
-        # Create basic auth header
-        auth_string = f"{WS_KEY}:"
-        auth_bytes = auth_string.encode('ascii')
-        auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-        headers = {
-            'Authorization': f'Basic {auth_b64}',
-            'Content-Type': 'application/xml'
-        }
+        mode = self.env['ir.config_parameter'].sudo().get_param('prestashop.stock_sync_mode', 'bulk')
+        if mode == 'bulk':
+            stats = self._sync_stock_batch_bulk(products_batch, force=force)
+            AdaptiveBatcher(self.env, 'stock').record(len(products_batch), time.monotonic() - started, stats['failed'])
+            return stats
 
         sync_success = 0
         sync_failed = 0
+        client = get_prestashop_client(self.env)
+        workers = int(self.env['ir.config_parameter'].sudo().get_param('prestashop.stock_sync_workers', 4))
 
-        for product_info in products_batch:
+        def _sync(product_info):
             try:
                 ean13 = product_info['reference']
                 new_qty = product_info['qty_available']
-                product_name = product_info['name']
-
-                _logger.info(f"JOB: Processing {product_name} (EAN13: {ean13}) - Stock: {new_qty}")
+                _logger.info(f"JOB: Processing {product_info['name']} (EAN13: {ean13}) - Stock: {new_qty}")
 
                 # Search and update combination stock
-                success = self._search_and_update_combination_stock(
-                    ean13, new_qty, BASE_URL, headers
+                return self._search_and_update_combination_stock(ean13, new_qty, client)
+            except Exception as e:
+                _logger.error(f"JOB: Error processing {product_info.get('reference', 'unknown')}: {e}")
+                return False
+
+        for product_info, success in zip(products_batch, run_concurrently(_sync, products_batch, workers)):
+            if success:
+                sync_success += 1
+                _logger.info(f"JOB: ✔ Successfully synced {product_info['name']}")
+            else:
+                sync_failed += 1
+                _logger.warning(f"JOB: ✘ Failed to sync {product_info['name']}")
+
+        _logger.info(f"JOB: Batch completed - Success: {sync_success}, Failed: {sync_failed}")
+        AdaptiveBatcher(self.env, 'stock').record(len(products_batch), time.monotonic() - started, sync_failed)
+
+    @api.model
+    def _sync_stock_batch_bulk(self, products_batch, force=False):
+        """Sync a whole batch: PUT through the stored mappings, list queries only for the misses"""
+        client = get_prestashop_client(self.env)
+        Mapping = self.env['prestashop.stock.mapping']
+        infos = {p['id']: p for p in products_batch}
+        stats = {'updated': 0, 'unchanged': 0, 'not_found': 0, 'failed': 0}
+
+        # Step 1: fresh mappings are PUT directly, without any lookup
+        fresh = Mapping._get_fresh_mappings(list(infos))
+        misses = [product_id for product_id in infos if product_id not in fresh]
+
+        puts = []
+        for product_id, mappings in fresh.items():
+            new_qty = int(infos[product_id]['qty_available'])
+            for mapping in mappings:
+                if not force and mapping.last_pushed_qty == new_qty:
+                    stats['unchanged'] += 1
+                    continue
+                puts.append((mapping, mapping._to_stock_available_node(), new_qty))
+
+        statuses = self._put_stock_availables_concurrently(client, [(node, new_qty) for _mapping, node, new_qty in puts])
+        for (mapping, _node, new_qty), status in zip(puts, statuses):
+            if status in (200, 201):
+                mapping.write({'last_pushed_qty': new_qty, 'last_push_date': fields.Datetime.now()})
+                stats['updated'] += 1
+            elif status == 404:
+                # Deleted on the PrestaShop side: drop it and resolve the product again
+                _logger.info(f"JOB: stock_available {mapping.stock_available_id} is gone, looking it up again")
+                product_id = mapping.product_id.id
+                mapping.unlink()
+                if product_id not in misses:
+                    misses.append(product_id)
+            else:
+                stats['failed'] += 1
+
+        # Step 2: resolve the misses with list queries and store their mappings
+        if misses:
+            self._sync_stock_lookup(client, [infos[product_id] for product_id in misses], stats)
+
+        _logger.info(
+            f"JOB: Bulk batch completed - Updated: {stats['updated']}, Unchanged: {stats['unchanged']}, "
+            f"Not found: {stats['not_found']}, Failed: {stats['failed']}, Looked up: {len(misses)}"
+        )
+        return stats
+
+    @api.model
+    def _sync_stock_lookup(self, client, products_info, stats):
+        """Look up combination/stock_available ids for products without a fresh mapping, then PUT"""
+        Mapping = self.env['prestashop.stock.mapping']
+
+        # Combination ids stored at export time spare the reference search
+        known = {
+            product.id: str(product.id_prestashop_variant)
+            for product in self.browse([info['id'] for info in products_info])
+            if product.id_prestashop_variant
+        }
+        stock_nodes = self._fetch_stock_availables_by_combination(client, list(set(known.values())))
+
+        # Unknown or stale combination ids fall back to filter[reference]
+        to_search = {
+            info['reference']: info['id'] for info in products_info
+            if not stock_nodes.get(known.get(info['id']))
+        }
+        if to_search:
+            found = self._fetch_combination_ids_by_reference(client, list(to_search))
+            for reference, combination_id in found.items():
+                known[to_search[reference]] = combination_id
+            stock_nodes.update(self._fetch_stock_availables_by_combination(client, list(set(found.values()))))
+
+        puts = []
+        for info in products_info:
+            combination_id = known.get(info['id'])
+            nodes = stock_nodes.get(combination_id) if combination_id else None
+            if not nodes:
+                stats['not_found'] += 1
+                _logger.warning(f"JOB: No combination/stock_available found for reference {info['reference']}")
+                continue
+
+            new_qty = int(info['qty_available'])
+            for node in nodes:
+                mapping = Mapping._store_from_node(info['id'], node)
+                old_qty = (node.findtext('quantity') or '').strip()
+                if old_qty == str(new_qty):
+                    stats['unchanged'] += 1
+                    continue
+                puts.append((info, mapping, node, old_qty, new_qty))
+
+        statuses = self._put_stock_availables_concurrently(client, [(node, new_qty) for _info, _mapping, node, _old, new_qty in puts])
+        for (info, mapping, _node, old_qty, new_qty), status in zip(puts, statuses):
+            if status in (200, 201):
+                mapping.write({'last_pushed_qty': new_qty, 'last_push_date': fields.Datetime.now()})
+                stats['updated'] += 1
+                _logger.info(
+                    f"✔ PRESTASHOP SYNC: Updated stock_available {mapping.stock_available_id} for reference "
+                    f"{info['reference']} (combination {mapping.combination_id}): {old_qty} → {new_qty}"
                 )
+            else:
+                stats['failed'] += 1
 
-                if success:
-                    sync_success += 1
-                    _logger.info(f"JOB: ✔ Successfully synced {product_name}")
-                else:
-                    sync_failed += 1
-                    _logger.warning(f"JOB: ✘ Failed to sync {product_name}")
+    @api.model
+    def _put_stock_availables_concurrently(self, client, nodes_and_qty):
+        """PUT [(stock_available node, qty)] through a bounded thread pool, statuses come back in order"""
+        workers = int(self.env['ir.config_parameter'].sudo().get_param('prestashop.stock_sync_workers', 4))
+        return run_concurrently(
+            lambda item: self._put_stock_available_quantity(client, *item), nodes_and_qty, workers
+        )
 
-                # Small delay between products
-                time.sleep(0.2)
+    @api.model
+    def _fetch_combination_ids_by_reference(self, client, references):
+        """Return {reference: combination id} using filter[reference]=[a|b|c] list queries"""
+        combination_ids = {}
+        for root in list_filtered(client, "combinations", 'reference', references, {'display': '[id,reference]'}):
+            for combination in root.findall('.//combination'):
+                reference = (combination.findtext('reference') or '').strip()
+                combination_id = (combination.findtext('id') or '').strip()
+                # Keep the first match, like the single-product lookup does
+                if reference and combination_id and reference not in combination_ids:
+                    combination_ids[reference] = combination_id
+        return combination_ids
 
-            except Exception as e:
-                sync_failed += 1
-                _logger.error(f"JOB: Error processing {product_info.get('reference', 'unknown')}: {e}")
+    @api.model
+    def _fetch_stock_availables_by_combination(self, client, combination_ids):
+        """Return {combination id: [stock_available nodes]} using filter[id_product_attribute]=[a|b|c]"""
+        stock_nodes = defaultdict(list)
+        for root in list_filtered(
+            client, "stock_availables", 'id_product_attribute', combination_ids, {'display': 'full'}
+        ):
+            for node in root.findall('.//stock_available'):
+                combination_id = (node.findtext('id_product_attribute') or '').strip()
+                if combination_id:
+                    stock_nodes[combination_id].append(node)
+        return stock_nodes
 
-        _logger.info(f"JOB: Batch completed - Success: {sync_success}, Failed: {sync_failed}")
+    @api.model
+    def _put_stock_available_quantity(self, client, stock_available_node, new_quantity):
+        """PUT a stock_available node with a new quantity, return the HTTP status (None on error)"""
+        stock_id = stock_available_node.findtext('id')
+        quantity_node = stock_available_node.find('quantity')
+        if not stock_id or quantity_node is None:
+            return None
+
+        quantity_node.text = str(int(new_quantity))
+        updated_doc = ET.Element('prestashop', xmlns_xlink="http://www.w3.org/1999/xlink")
+        updated_doc.append(stock_available_node)
+        updated_data = ET.tostring(updated_doc, encoding='utf-8', xml_declaration=True)
+
+        try:
+            resp = client.put(
+                f"stock_availables/{stock_id}",
+                data=updated_data,
+                headers={'Content-Type': 'application/xml'},
+                timeout=30
+            )
+            if resp.status_code not in (200, 201):
+                _logger.warning(f"PUT failed: stock_availables/{stock_id} | Status: {resp.status_code}")
+            return resp.status_code
+        except Exception as e:
+            _logger.warning(f"Exception during PUT: stock_availables/{stock_id} | Error: {e}")
+            return None
 
     # ==================== HELPER METHODS ====================
     @api.model
-    def _search_and_update_combination_stock(self, ean13, new_quantity, base_url, headers):
-        """Search for combination by EAN13 and update its stock directly"""
+    def _search_and_update_combination_stock(self, ean13, new_quantity, client=None):
+        """Search for combination by EAN13 and update its stock directly (HTTP only when given a client)"""
         try:
             # Step 1: Search for combinations by EAN13
-            search_url = f"{base_url}/combinations?filter[reference]={ean13}&display=full"
+            search_url = f"combinations?filter[reference]={ean13}&display=full"
             _logger.info(f"Searching combinations: {search_url}")
 
-            combinations_root = self._get_xml(search_url, headers)
+            combinations_root = self._get_xml(search_url, client)
             if combinations_root is None:
                 _logger.warning(f"Failed to get combinations response for EAN13 {ean13}")
                 return False
@@ -1413,8 +2189,8 @@ class ProductProductPrest(models.Model):
             combination_id = combination_id_elem.text.strip()
 
             # Step 2: Get stock_available by combination ID
-            stock_search_url = f"{base_url}/stock_availables?filter[id_product_attribute]={combination_id}&display=full"
-            stock_root = self._get_xml(stock_search_url, headers)
+            stock_search_url = f"stock_availables?filter[id_product_attribute]={combination_id}&display=full"
+            stock_root = self._get_xml(stock_search_url, client)
 
             if stock_root is None:
                 _logger.warning(f"Failed to get stock_availables for combination ID {combination_id}")
@@ -1443,8 +2219,8 @@ class ProductProductPrest(models.Model):
                 _logger.info(f"Updating stock_available ID {stock_id} for combination {combination_id}")
 
                 # Get the full stock_available details for update
-                stock_detail_url = f"{base_url}/stock_availables/{stock_id}"
-                stock_detail = self._get_xml(stock_detail_url, headers)
+                stock_detail_url = f"stock_availables/{stock_id}"
+                stock_detail = self._get_xml(stock_detail_url, client)
 
                 if stock_detail is None:
                     _logger.warning(f"Failed to get stock_available details for ID {stock_id}")
@@ -1465,7 +2241,7 @@ class ProductProductPrest(models.Model):
                     updated_data = ET.tostring(updated_doc, encoding='utf-8', xml_declaration=True)
 
                     # Send update
-                    response = self._put_xml(stock_detail_url, updated_data, headers)
+                    response = self._put_xml(stock_detail_url, updated_data, client)
 
                     if response and response.status_code in (200, 201):
                         _logger.info(
@@ -1476,9 +2252,6 @@ class ProductProductPrest(models.Model):
                     else:
                         _logger.warning(f"Failed to update stock_available {stock_id}")
 
-                # Small delay between updates
-                time.sleep(0.1)
-
             return updated_count > 0
 
         except Exception as e:
@@ -1486,10 +2259,10 @@ class ProductProductPrest(models.Model):
             return False
 
     @api.model
-    def _get_xml(self, url, headers):
+    def _get_xml(self, url, client=None):
         """Helper method to GET XML from PrestaShop"""
         try:
-            resp = requests.get(url, headers=headers, timeout=60)
+            resp = (client or get_prestashop_client(self.env)).get(url, timeout=60)
             if resp.status_code != 200:
                 _logger.warning(f"GET failed: {url} | Status: {resp.status_code}")
                 return None
@@ -1499,10 +2272,12 @@ class ProductProductPrest(models.Model):
             return None
 
     @api.model
-    def _put_xml(self, url, data, headers):
+    def _put_xml(self, url, data, client=None):
         """Helper method to PUT XML to PrestaShop"""
         try:
-            resp = requests.put(url, data=data, headers=headers, timeout=30)
+            resp = (client or get_prestashop_client(self.env)).put(
+                url, data=data, headers={'Content-Type': 'application/xml'}, timeout=30
+            )
             if resp.status_code not in (200, 201):
                 _logger.warning(f"PUT failed: {url} | Status: {resp.status_code}")
                 return None
@@ -1540,33 +2315,119 @@ class ProductProductPrest(models.Model):
 
         _logger.info(f"Found {len(recent_move_lines)} stock move lines from today")
 
-        # Get unique products from the move lines
-        product_ids = set()
-        for move_line in recent_move_lines:
-            product_ids.add(move_line.product_id.id)
-
-        _logger.info(f"Identified {len(product_ids)} unique products from today's stock moves")
-
-        # Get current stock quantities for these products
-        affected_products = []
-        for product_id in product_ids:
-            product = self.env['product.product'].browse(product_id)
-            if product and product.default_code:
-                affected_products.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'reference': product.default_code,
-                    'qty_available': product.qty_available,
-                    'write_date': product.write_date
-                })
-                _logger.info(
-                    f"Product affected: {product.name} (EAN13: {product.default_code}) - "
-                    f"Current Stock: {product.qty_available}"
-                )
+        # Same quantity computation as the watermark scan
+        affected_products = self._get_stock_sync_products(recent_move_lines.product_id.ids)
 
         _logger.info(f"=== Found {len(affected_products)} products to sync from today ===")
         return affected_products
 
+    @api.model
+    def get_products_from_stock_move_lines_since_watermark(self):
+        """
+        Get products affected by done stock move lines written since the last run
+        Returns (products with their current stock quantities, new watermark)
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        watermark = self.env['prestashop.watermark'].sudo()._get('stock_sync')
+        if watermark:
+            # Small overlap: write_date is the transaction start, late commits can land behind it
+            overlap = int(ICP.get_param('prestashop.stock_sync.overlap_seconds', 300))
+            since = fields.Datetime.from_string(watermark) - timedelta(seconds=overlap)
+        else:
+            # First run: same window as the daily scan
+            since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        _logger.info(f"Searching for done stock move lines written since {since}")
+
+        # One grouped query: unique products and their latest move line write_date
+        groups = self.env['stock.move.line'].read_group([
+            ('write_date', '>=', since),
+            ('state', '=', 'done'),
+            ('product_id.default_code', '!=', False),
+            ('product_id.default_code', '!=', ''),
+        ], ['product_id', 'write_date:max'], ['product_id'], lazy=False)
+
+        if not groups:
+            _logger.info("No stock move lines found since last run")
+            return [], None
+
+        new_watermark = max(g['write_date'] for g in groups)
+        product_ids = [g['product_id'][0] for g in groups]
+        _logger.info(f"Identified {len(product_ids)} unique products from stock moves since {since}")
+
+        affected_products = self._get_stock_sync_products(product_ids)
+
+        _logger.info(f"=== Found {len(affected_products)} products to sync since {since} ===")
+        return affected_products, new_watermark
+
+    @api.model
+    def _get_stock_sync_products(self, product_ids):
+        """Build the stock sync payload for products, with quantities from one grouped stock.quant read"""
+        # Same locations qty_available uses
+        domain_quant_loc = self._get_domain_locations()[0]
+        quantities = {
+            g['product_id'][0]: g['quantity']
+            for g in self.env['stock.quant'].read_group(
+                [('product_id', 'in', list(product_ids))] + domain_quant_loc,
+                ['product_id', 'quantity:sum'], ['product_id'], lazy=False
+            )
+        }
+
+        products = []
+        for product in self.browse(product_ids):
+            if not product.default_code:
+                continue
+            products.append({
+                'id': product.id,
+                'name': product.name,
+                'reference': product.default_code,
+                'qty_available': quantities.get(product.id, 0.0),
+                'write_date': product.write_date
+            })
+        return products
+
+    # ==================== EVENT-DRIVEN SYNC ====================
+    @api.model
+    def _queue_stock_sync_event(self, product_ids):
+        """Record products whose stock just moved and schedule one debounced flush job"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        if not product_ids or ICP.get_param('prestashop.stock_sync_event_driven', 'False') != 'True':
+            return
+
+        products = self.browse(product_ids).filtered('default_code')
+        if not products:
+            return
+
+        self.env['prestashop.stock.event'].sudo().create([{'product_id': p.id} for p in products])
+
+        # The identity key keeps a single pending flush: later events just join it
+        debounce = int(ICP.get_param('prestashop.stock_sync_debounce_seconds', 5))
+        self.with_delay(
+            channel='root.prestashop_stock',
+            priority=5,
+            eta=debounce,
+            identity_key='prestashop_stock_event_flush',
+            description="Flush PrestaShop Stock Events",
+        )._job_flush_stock_events()
+
+    @api.model
+    def _job_flush_stock_events(self):
+        """Background job: push the coalesced products collected by _queue_stock_sync_event"""
+        events = self.env['prestashop.stock.event'].sudo().search([])
+        if not events:
+            return
+
+        product_ids = list(set(events.mapped('product_id').ids))
+        events.unlink()
+
+        products, skipped = self._filter_stock_deltas(self._get_stock_sync_products(product_ids))
+        _logger.info(
+            f"JOB: Flushing {len(events)} stock event(s): {len(products)} product(s) to push, "
+            f"{skipped} already up to date"
+        )
+        for batch in chunked(products, AdaptiveBatcher(self.env, 'stock').size()):
+            self._job_sync_stock_batch(batch)
+
     # ==================== UTILITY METHODS ====================
     @api.model
     def log_stock_move_lines_for_product(self, ean13, from_today=True):
@@ -1650,8 +2511,8 @@ class ProductProductPrest(models.Model):
                 }
             }
 
-        # Create queue jobs
-        self._create_stock_sync_jobs(products_to_sync)
+        # Create queue jobs, pushing even quantities PrestaShop should already have
+        self._create_stock_sync_jobs(products_to_sync, force=True)
 
         return {
             'type': 'ir.actions.client',
@@ -1677,6 +2538,10 @@ class WebsiteOrder(models.Model):
     _inherit = ['mail.thread', 'mail.activity.mixin']
 
     ticket_id = fields.Char(string="Id Commande", required=True, unique=True)
+
+    _sql_constraints = [
+        ('ticket_id_uniq', 'unique(ticket_id)', 'This PrestaShop order is already imported.'),
+    ]
     reference = fields.Char(string="Référence de la commande")
     payment_method = fields.Char(string="Mode de Paiement")
     store_id = fields.Integer(string="Store ID")
@@ -1753,8 +2618,6 @@ class WebsiteOrder(models.Model):
     )
     medafrica_status = fields.Char(string="Medafrica Status", readonly=True)
     colis_destination = fields.Char(string="Colis - Troli", readonly=True, tracking=True)
-    BASE_URL = "https://outletna.com/api"
-    WS_KEY = "86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N"
 
     @api.depends('line_ids.quantity')
     def _compute_total_qty(self):
@@ -3359,6 +4222,19 @@ class WebsiteOrder(models.Model):
 
     @api.model
     def sync_status_to_prestashop(self):
+        """Cron entry point: run the status sync as a job on the orders channel"""
+        self.with_delay(
+            channel='root.prestashop_order_status',
+            priority=10,
+            identity_key='prestashop_order_status_sync',
+            description="Sync Order Statuses to PrestaShop",
+        )._job_sync_status_to_prestashop()
+
+    @api.model
+    def _job_sync_status_to_prestashop(self):
+        if not try_job_lock(self.env.cr, 'prestashop_order_status_sync'):
+            _logger.info("PrestaShop status synchronization already running, skipped")
+            return
         _logger.info("Starting PrestaShop status synchronization...")
 
         # Sync only the supported statuses
@@ -3396,12 +4272,11 @@ class WebsiteOrder(models.Model):
         Find PrestaShop order ID by reference using basic authentication
         """
         try:
-            url = f"{self.BASE_URL}/orders"
             params = {
                 'filter[reference]': reference,
             }
 
-            response = requests.get(url, auth=(self.WS_KEY, ''), params=params, timeout=30)
+            response = get_prestashop_client(self.env).get("orders", params=params, timeout=30)
             response.raise_for_status()
 
             root = ET.fromstring(response.content)
@@ -3460,8 +4335,9 @@ class WebsiteOrder(models.Model):
         Update the current_state of a PrestaShop order
         """
         try:
-            url = f"{self.BASE_URL}/orders/{order_id}"
-            response = requests.get(url, auth=(self.WS_KEY, ''))
+            client = get_prestashop_client(self.env)
+            url = f"orders/{order_id}"
+            response = client.get(url)
             response.raise_for_status()
 
             root = ET.fromstring(response.content)
@@ -3477,9 +4353,8 @@ class WebsiteOrder(models.Model):
 
             headers = {'Content-Type': 'application/xml'}
 
-            update_response = requests.put(
+            update_response = client.put(
                 url,
-                auth=(self.WS_KEY, ''),
                 data=xml_data,
                 headers=headers
             )
@@ -3499,7 +4374,20 @@ class WebsiteOrder(models.Model):
             return False
     @api.model
     def _create_shippement_number_to_prestashop(self):
+        """Cron entry point: send the shipping numbers as a job on the shipping channel"""
+        self.with_delay(
+            channel='root.prestashop_shipping',
+            priority=10,
+            identity_key='prestashop_shipping_number_sync',
+            description="Send Shipping Numbers to PrestaShop",
+        )._job_create_shippement_number_to_prestashop()
+
+    @api.model
+    def _job_create_shippement_number_to_prestashop(self):
         """Send shipment_number to Prestashop (Basic Auth + XML)."""
+        if not try_job_lock(self.env.cr, 'prestashop_shipping_number_sync'):
+            _logger.info("[CRON] Shipping number sync already running, skipped")
+            return True
         _logger.info("[CRON] Sync shipping_number → Prestashop started...")
         orders = self.search([
             ('status', '=', 'en_cours_de_livraison'),
@@ -3509,17 +4397,17 @@ class WebsiteOrder(models.Model):
         if not orders:
             _logger.info("[CRON] No orders needing sync.")
             return True
+        client = get_prestashop_client(self.env)
         for order in orders:
             try:
                 # ---- 1) FIND ORDER ID BY REFERENCE ----
                 filter_url = (
-                    f"{order.BASE_URL}/orders/"
+                    f"orders/"
                     f"?filter[reference]={order.reference}"
                 )
                 _logger.info(f"[CRON] Searching Prestashop order with reference {order.reference}")
-                response = requests.get(
+                response = client.get(
                     filter_url,
-                    auth=(order.WS_KEY, ''),  # Basic Auth
                     timeout=20
                 )
                 response.raise_for_status()
@@ -3536,11 +4424,10 @@ class WebsiteOrder(models.Model):
                 _logger.info(f"[CRON] Prestashop order ID found: {ps_order_id}")
 
                 # ---- 2) GET FULL ORDER DATA ----
-                order_url = f"{order.BASE_URL}/orders/{ps_order_id}"
+                order_url = f"orders/{ps_order_id}"
 
-                response = requests.get(
+                response = client.get(
                     order_url,
-                    auth=(order.WS_KEY, ''),
                     timeout=120,
                 )
                 response.raise_for_status()
@@ -3558,11 +4445,10 @@ class WebsiteOrder(models.Model):
                 updated_xml = etree.tostring(order_xml, encoding='utf-8', xml_declaration=True)
 
                 # ---- 4) PUT BACK TO PRESTASHOP ----
-                put_response = requests.put(
+                put_response = client.put(
                     order_url,
                     data=updated_xml,
                     headers={'Content-Type': 'application/xml'},
-                    auth=(order.WS_KEY, ''),
                     timeout=120,
                 )
                 put_response.raise_for_status()
@@ -3803,9 +4689,8 @@ class WebsiteOrder(models.Model):
                 # PART 2 — GET full order from PrestaShop
                 # ════════════════════════════════════════════
 
-                get_order_response = requests.get(
-                    f"{self.BASE_URL}/orders/{prestashop_order_id}",
-                    auth=(self.WS_KEY, ""),
+                get_order_response = get_prestashop_client(self.env).get(
+                    f"orders/{prestashop_order_id}",
                     timeout=60
                 )
 
@@ -3966,9 +4851,8 @@ class WebsiteOrder(models.Model):
           </order>
         </prestashop>"""
 
-                put_order_response = requests.put(
-                    f"{self.BASE_URL}/orders/{prestashop_order_id}",
-                    auth=(self.WS_KEY, ""),
+                put_order_response = get_prestashop_client(self.env).put(
+                    f"orders/{prestashop_order_id}",
                     headers={"Content-Type": "application/xml"},
                     data=order_xml.encode('utf-8'),
                     timeout=60
@@ -3990,9 +4874,8 @@ class WebsiteOrder(models.Model):
                 # PART 4 — GET order_invoice from PrestaShop
                 # ════════════════════════════════════════════
 
-                list_response = requests.get(
-                    f"{self.BASE_URL}/order_invoices",
-                    auth=(self.WS_KEY, ""),
+                list_response = get_prestashop_client(self.env).get(
+                    f"order_invoices",
                     params={'filter[id_order]': prestashop_order_id},
                     timeout=60
                 )
@@ -4026,9 +4909,8 @@ class WebsiteOrder(models.Model):
                 )
 
                 # ── GET full invoice to preserve all fields ──
-                get_inv_response = requests.get(
-                    f"{self.BASE_URL}/order_invoices/{ps_invoice_id}",
-                    auth=(self.WS_KEY, ""),
+                get_inv_response = get_prestashop_client(self.env).get(
+                    f"order_invoices/{ps_invoice_id}",
                     timeout=30
                 )
 
@@ -4097,9 +4979,8 @@ class WebsiteOrder(models.Model):
           </order_invoice>
         </prestashop>"""
 
-                put_inv_response = requests.put(
-                    f"{self.BASE_URL}/order_invoices/{ps_invoice_id}",
-                    auth=(self.WS_KEY, ""),
+                put_inv_response = get_prestashop_client(self.env).put(
+                    f"order_invoices/{ps_invoice_id}",
                     headers={"Content-Type": "application/xml"},
                     data=invoice_xml.encode('utf-8'),
                     timeout=30
@@ -4229,27 +5110,42 @@ class CustomerFetcher(models.TransientModel):
     _name = 'customer.fetch'
     _description = 'Customer Data Fetcher'
 
-    API_BASE_URL = "https://outletna.com/api"
-    TOKEN = "86TN4NX1QDTBJC2XS9HUHL9RI53ANB3N"
-
     @api.model
     def fetch_customer_data(self):
+        """Cron entry point: import new orders as a job on the orders channel"""
+        self.with_delay(
+            channel='root.prestashop_orders',
+            priority=10,
+            identity_key='prestashop_order_import',
+            description="Import PrestaShop Orders",
+        )._job_fetch_customer_data()
+
+    @api.model
+    def _job_fetch_customer_data(self):
+        if not try_job_lock(self.env.cr, 'prestashop_order_import'):
+            _logger.info("Order import already running, skipped")
+            return
         _logger.info("Starting order data fetch...")
+        last_id = int(self.env['prestashop.watermark'].sudo()._get('order_import.last_id', 0) or 0)
 
-        # Get yesterday and today dates
-        today = datetime.now().date()
-        yesterday = today - timedelta(days=2)
-        tomorrow = today + timedelta(days=1)
+        if last_id:
+            # Only orders created after the last one imported
+            orders_url = f"orders?filter[id]=>[{last_id}]&sort=[id_ASC]"
+        else:
+            # First run: bootstrap from the last days
+            today = datetime.now().date()
+            yesterday = today - timedelta(days=2)
+            tomorrow = today + timedelta(days=1)
 
-        # Format dates for API filter
-        date_filter = f"[{yesterday},{tomorrow}]"
-        orders_url = f"{self.API_BASE_URL}/orders?filter[date_add]={date_filter}&date=1"
+            # Format dates for API filter
+            date_filter = f"[{yesterday},{tomorrow}]"
+            orders_url = f"orders?filter[date_add]={date_filter}&date=1"
 
         try:
             _logger.info("Making API request to: %s", orders_url)
 
             # Use basic authentication with token as username
-            response = requests.get(orders_url, auth=(self.TOKEN, ''))
+            response = get_prestashop_client(self.env).get(orders_url)
 
             if response.status_code == 200:
                 _logger.info("SUCCESS: API call successful!")
@@ -4263,17 +5159,32 @@ class CustomerFetcher(models.TransientModel):
                 order_elements = orders.findall('order')
                 _logger.info("Total orders found: %d", len(order_elements))
 
+                listed_ids = [order.get('id') for order in order_elements]
+                existing_ids = self._get_existing_ticket_ids(listed_ids)
+
+                new_order_ids = []
                 for i, order in enumerate(order_elements):
                     order_id = order.get('id')
                     href = order.get('{http://www.w3.org/1999/xlink}href')
 
                     # Check if order already exists in Odoo
-                    if self.env['stock.website.order'].search([('ticket_id', '=', order_id)], limit=1):
+                    if order_id in existing_ids:
                         _logger.info("Skipping existing order ID=%s", order_id)
                         continue
 
                     _logger.info("New Order %s: ID=%s, URL=%s", i + 1, order_id, href)
-                    self._fetch_and_log_order_details(order_id)
+                    new_order_ids.append(order_id)
+
+                # 'batch' imports with list queries; 'single' keeps the one-order-at-a-time fetches
+                mode = self.env['ir.config_parameter'].sudo().get_param('prestashop.order_import_mode', 'batch')
+                if mode == 'batch':
+                    if new_order_ids:
+                        self._import_orders_batched(new_order_ids)
+                else:
+                    for order_id in new_order_ids:
+                        self._fetch_and_log_order_details(order_id)
+
+                self._advance_order_watermark(listed_ids, last_id)
 
             else:
                 _logger.error("FAILED: Status %s - %s", response.status_code, response.text)
@@ -4289,10 +5200,10 @@ class CustomerFetcher(models.TransientModel):
 
         _logger.info("Order data fetch completed")
     def _fetch_and_log_order_details(self, order_id):
-        order_url = f"{self.API_BASE_URL}/orders/{order_id}"
+        order_url = f"orders/{order_id}"
         try:
             # Use basic authentication here too
-            response = requests.get(order_url, auth=(self.TOKEN, ''), timeout=300)
+            response = get_prestashop_client(self.env).get(order_url, timeout=300)
             if response.status_code == 200:
                 tree = ET.fromstring(response.content)
                 order = tree.find('order')
@@ -4304,139 +5215,384 @@ class CustomerFetcher(models.TransientModel):
                 address_delivery_url = address_delivery_elem.attrib.get('{http://www.w3.org/1999/xlink}href')
 
                 customer_details = self._get_complete_customer_details(customer_url, address_delivery_url)
-
-                # Get or create/update contact based on phone and email
-                partner = self._find_or_create_partner(customer_details)
-
-                # Order info
-                date_commande_str = order.findtext('date_add', default='').strip()
-                date_commande = datetime.strptime(date_commande_str,
-                                                  '%Y-%m-%d %H:%M:%S').date() if date_commande_str else None
-                reference = order.findtext('reference', default='').strip()
-                payment = order.findtext('payment', default='').strip()
-                if payment == "Paiement comptant à la livraison (Cash on delivery)":
-                    payment = "COD"
-                # Use PrestaShop data for order_rec, not Odoo partner data
-                order_rec = self.env['stock.website.order'].create({
-                    'ticket_id': order_id,
-                    'reference': reference,
-                    'client_name': f"{customer_details.get('firstname', '')} {customer_details.get('lastname', '')}".strip(),
-                    'email': customer_details.get('email', ''),
-                    'phone': customer_details.get('phone', ''),
-                    'mobile': customer_details.get('phone_mobile', ''),
-                    'adresse': customer_details.get('address1', ''),
-                    'second_adresse': customer_details.get('address2', ''),
-                    'city': customer_details.get('city', ''),
-                    'postcode': customer_details.get('postcode', ''),
-                    'pays': self.env['res.country'].search([('name', '=', customer_details.get('country'))],
-                                                           limit=1) if customer_details.get('country') else False,
-                    'date_commande': date_commande,
-                    'payment_method': payment,
-                })
-
-                order_rows = order.findall('.//order_row')
-                total_amount = 0
-
-                for row in order_rows:
-                    product_name = row.findtext('product_name', default='').strip()
-                    product_reference = row.findtext('product_reference', default='').strip()
-                    quantity = row.findtext('product_quantity', default='0').strip()
-                    price = row.findtext('product_price', default='0.00').strip()
-                    unit_price_incl = row.findtext('unit_price_tax_incl', default='0.00').strip()
-                    line_total = float(quantity) * float(unit_price_incl) if quantity and unit_price_incl else 0
-                    total_amount += line_total
-
-                    product = self.env['product.product'].search([('default_code', '=', product_reference)], limit=1)
-                    if not product:
-                        _logger.warning("No product found with reference: %s", product_reference)
-                        continue
-
-                    line = self.env['stock.website.order.line'].create({
-                        'order_id': order_rec.id,
-                        'product_id': product.id,
-                        'code_barre': product_reference,
-                        'product_name': product.name,
-                        'price': unit_price_incl,
-                        'quantity': float(quantity),
-                        'discount': float(row.findtext('total_discounts', default='0.00')),
-                    })
-                    # Set warehouse location for this specific line
-                    line.set_warehouse_location()
-                    '''26-02
-                    self.env['stock.website.order.line'].create({
-                        'order_id': order_rec.id,
-                        'product_id': product.id,
-                        'code_barre': product_reference,
-                        'product_name': product.name,
-                        'price':unit_price_incl,
-                        'quantity': float(quantity),
-                        'discount': float(row.findtext('total_discounts', default='0.00')),
-                    })
-                    '''
-                total_paid = order.findtext('total_paid_tax_incl', default='0.00')
-                payment_method = order.findtext('payment', default='')
-
-                _logger.info("ORDER #%s Summary:", order_id)
-                _logger.info("   Total Paid: %s MAD", total_paid)
-                _logger.info("   Payment Method: %s", payment_method)
-                _logger.info("=" * 80)
-                try:
-                    order_rec.action_create_sale_order()
-                    _logger.info("✅ Sale order automatically created for website order %s", order_id)
-                except Exception as e:
-                    _logger.error("Failed to auto-create sale order for website order %s: %s", order_id, str(e))
+                self._try_create_website_order(order_id, order, customer_details)
             else:
                 _logger.error("Failed to fetch order details for %s, status code: %s", order_id, response.status_code)
         except Exception as e:
             _logger.exception("Exception fetching details for order %s: %s", order_id, str(e))
-    def _get_complete_customer_details(self, customer_url, address_url):
-        """Fetch complete customer details including address information"""
-        customer_details = {}
 
-        # Fetch customer basic info
-        if customer_url:
-            customer_data = self._fetch_api_data(customer_url)
-            if customer_data:
-                tree = ET.fromstring(customer_data)
-                customer_details.update({
-                    'firstname': self._get_text_content(tree, './/firstname'),
-                    'lastname': self._get_text_content(tree, './/lastname'),
-                    'email': self._get_text_content(tree, './/email'),
-                })
+    def _try_create_website_order(self, order_id, order, customer_details):
+        """Create the website order in a savepoint, count a failed attempt when it raises"""
+        try:
+            with self.env.cr.savepoint():
+                self._create_website_order(order_id, order, customer_details)
+            return True
+        except Exception as e:
+            _logger.exception("Exception importing order %s: %s", order_id, str(e))
+            self.env['prestashop.order.import.failure'].sudo()._record(order_id)
+            return False
 
-        # Fetch address details
-        if address_url:
-            address_data = self._fetch_api_data(address_url)
-            if address_data:
-                tree = ET.fromstring(address_data)
-                customer_details.update({
-                    'phone': self._get_text_content(tree, './/phone'),
-                    'phone_mobile': self._get_text_content(tree, './/phone_mobile'),
-                    'company': self._get_text_content(tree, './/company'),
-                    'address1': self._get_text_content(tree, './/address1'),
-                    'address2': self._get_text_content(tree, './/address2'),
-                    'city': self._get_text_content(tree, './/city'),
-                    'postcode': self._get_text_content(tree, './/postcode'),
-                })
+    def _create_website_order(self, order_id, order, customer_details):
+        """Create the website order, its lines and its sale order from an order node"""
+        # Get or create/update contact based on phone and email
+        partner = self._find_or_create_partner(customer_details)
+
+        # Order info
+        date_commande_str = order.findtext('date_add', default='').strip()
+        date_commande = datetime.strptime(date_commande_str,
+                                          '%Y-%m-%d %H:%M:%S').date() if date_commande_str else None
+        reference = order.findtext('reference', default='').strip()
+        payment = order.findtext('payment', default='').strip()
+        if payment == "Paiement comptant à la livraison (Cash on delivery)":
+            payment = "COD"
+        # Use PrestaShop data for order_rec, not Odoo partner data
+        order_rec = self.env['stock.website.order'].create({
+            'ticket_id': order_id,
+            'reference': reference,
+            'client_name': f"{customer_details.get('firstname', '')} {customer_details.get('lastname', '')}".strip(),
+            'email': customer_details.get('email', ''),
+            'phone': customer_details.get('phone', ''),
+            'mobile': customer_details.get('phone_mobile', ''),
+            'adresse': customer_details.get('address1', ''),
+            'second_adresse': customer_details.get('address2', ''),
+            'city': customer_details.get('city', ''),
+            'postcode': customer_details.get('postcode', ''),
+            'pays': customer_details.get('country_id', False),
+            'date_commande': date_commande,
+            'payment_method': payment,
+        })
+
+        order_rows = order.findall('.//order_row')
+        total_amount = 0
+
+        for row in order_rows:
+            product_name = row.findtext('product_name', default='').strip()
+            product_reference = row.findtext('product_reference', default='').strip()
+            quantity = row.findtext('product_quantity', default='0').strip()
+            price = row.findtext('product_price', default='0.00').strip()
+            unit_price_incl = row.findtext('unit_price_tax_incl', default='0.00').strip()
+            line_total = float(quantity) * float(unit_price_incl) if quantity and unit_price_incl else 0
+            total_amount += line_total
+
+            product = self.env['product.product'].search([('default_code', '=', product_reference)], limit=1)
+            if not product:
+                _logger.warning("No product found with reference: %s", product_reference)
+                continue
+
+            line = self.env['stock.website.order.line'].create({
+                'order_id': order_rec.id,
+                'product_id': product.id,
+                'code_barre': product_reference,
+                'product_name': product.name,
+                'price': unit_price_incl,
+                'quantity': float(quantity),
+                'discount': float(row.findtext('total_discounts', default='0.00')),
+            })
+            # Set warehouse location for this specific line
+            line.set_warehouse_location()
+            '''26-02
+            self.env['stock.website.order.line'].create({
+                'order_id': order_rec.id,
+                'product_id': product.id,
+                'code_barre': product_reference,
+                'product_name': product.name,
+                'price':unit_price_incl,
+                'quantity': float(quantity),
+                'discount': float(row.findtext('total_discounts', default='0.00')),
+            })
+            '''
+        total_paid = order.findtext('total_paid_tax_incl', default='0.00')
+        payment_method = order.findtext('payment', default='')
+
+        _logger.info("ORDER #%s Summary:", order_id)
+        _logger.info("   Total Paid: %s MAD", total_paid)
+        _logger.info("   Payment Method: %s", payment_method)
+        _logger.info("=" * 80)
+        try:
+            order_rec.action_create_sale_order()
+            _logger.info("✅ Sale order automatically created for website order %s", order_id)
+        except Exception as e:
+            _logger.error("Failed to auto-create sale order for website order %s: %s", order_id, str(e))
+        return order_rec
+
+    def _get_existing_ticket_ids(self, order_ids):
+        """Set of the given PrestaShop order ids already imported, from one search_read"""
+        if not order_ids:
+            return set()
+        return {
+            rec['ticket_id']
+            for rec in self.env['stock.website.order'].search_read([('ticket_id', 'in', list(order_ids))], ['ticket_id'])
+        }
+
+    def _advance_order_watermark(self, listed_ids, last_id):
+        """Move the order watermark up to the highest order id imported without a gap
+
+        Orders whose creation failed prestashop.order_import.max_attempts times are skipped.
+        """
+        listed = sorted(int(order_id) for order_id in listed_ids if order_id and order_id.isdigit())
+        if not listed:
+            return
+        imported = self._get_existing_ticket_ids([str(order_id) for order_id in listed])
+        Failure = self.env['prestashop.order.import.failure'].sudo()
+        max_attempts = int(self.env['ir.config_parameter'].sudo().get_param('prestashop.order_import.max_attempts', 5))
+
+        failures = {
+            rec.ps_order_id: rec
+            for rec in Failure.search([('ps_order_id', 'in', [str(order_id) for order_id in listed])])
+        }
+
+        watermark = last_id
+        for order_id in listed:
+            if str(order_id) not in imported:
+                # Only failed creations count: an order whose listing failed was not attempted
+                failure = failures.get(str(order_id))
+                if not failure or failure.attempts < max_attempts:
+                    _logger.warning(
+                        "Order %s not imported (%d failed attempt(s) of %d), it will be retried on the next poll",
+                        order_id, failure.attempts if failure else 0, max_attempts
+                    )
+                    break
+                _logger.error(
+                    "Order %s failed to import %d times, skipping it: import it by hand", order_id, failure.attempts
+                )
+                failure.skipped = True
+            watermark = order_id
+        Failure._clear(imported)
+        if watermark > last_id:
+            self.env['prestashop.watermark'].sudo()._set('order_import.last_id', watermark)
+
+    def _import_orders_batched(self, order_ids):
+        """Import orders with filter[id] list queries: orders, then their customers and addresses"""
+        client = get_prestashop_client(self.env)
+        order_nodes = self._fetch_resources_by_id(client, 'orders', 'order', order_ids)
+
+        customer_ids = {(node.findtext('id_customer') or '').strip() for node in order_nodes.values()}
+        address_ids = {(node.findtext('id_address_delivery') or '').strip() for node in order_nodes.values()}
+        related = self._fetch_cached_resources(client, {
+            'customers': ('customer', customer_ids),
+            'addresses': ('address', address_ids),
+        })
+        customers, addresses = related['customers'], related['addresses']
+
+        imported = 0
+        for order_id in order_ids:
+            order = order_nodes.get(str(order_id))
+            if order is None:
+                _logger.error("Order %s missing from the PrestaShop listing", order_id)
+                continue
+            customer_id = (order.findtext('id_customer') or '').strip()
+            address_id = (order.findtext('id_address_delivery') or '').strip()
+            customer = customers.get(customer_id)
+            address = addresses.get(address_id)
+            # A failed listing must not import a blank customer/address: retried on the next poll
+            if (customer is None and customer_id not in ('', '0')) or (address is None and address_id not in ('', '0')):
+                _logger.warning("Customer or address of order %s not fetched, order left for the next poll", order_id)
+                continue
+            customer_details = self._customer_details_from_nodes(customer, address)
+            if self._try_create_website_order(str(order_id), order, customer_details):
+                imported += 1
+
+        _logger.info("Imported %d/%d order(s)", imported, len(order_ids))
+        return imported
+
+    def _fetch_cached_resources(self, client, wanted):
+        """{resource: {id: node}} for {resource: (tag, ids)}, served from the customer/address cache
 
-                # Get country name if available
-                country_elem = tree.find('.//id_country')
-                if country_elem is not None:
-                    country_url = country_elem.attrib.get('{http://www.w3.org/1999/xlink}href')
-                    if country_url:
-                        country_data = self._fetch_api_data(country_url)
-                        if country_data:
-                            country_tree = ET.fromstring(country_data)
-                            country_name = self._get_text_content(country_tree, './/name')
-                            customer_details['country'] = country_name
+        Expired entries (prestashop.customer_cache_ttl_seconds) are refetched only when date_upd changed.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        ttl = int(ICP.get_param('prestashop.customer_cache_ttl_seconds', 3600))
+        use_db = ICP.get_param('prestashop.customer_cache_db', 'False') == 'True'
+        dbname = self.env.cr.dbname
+        DbCache = self.env['prestashop.resource.cache'].sudo()
+        now = time.time()
+
+        # Cache lookups, on this thread
+        plans = {}
+        for resource, (tag, ids) in wanted.items():
+            ids = {str(i) for i in ids} - {'', '0'}
+            if not ids:
+                continue
+            cached = memory_cache_get(dbname, resource, ids)
+            if use_db and len(cached) < len(ids):
+                from_db = DbCache._lookup(resource, ids - set(cached))
+                memory_cache_set(dbname, resource, from_db)
+                cached.update(from_db)
+            plans[resource] = {
+                'tag': tag,
+                'cached': cached,
+                'expired': [ps_id for ps_id, entry in cached.items() if now - entry['cached_at'] > ttl],
+                'to_fetch': ids - set(cached),
+                'touched': {},
+                'fetched': {},
+            }
 
+        def _full(resource, ids):
+            return (resource, plans[resource]['tag'], ids, cached_fields_display(resource))
+
+        # Round 1: revalidate expired entries and fetch unknown ids, all resources at once
+        listings = []
+        for resource, plan in plans.items():
+            if plan['expired']:
+                listings.append((resource, plan['tag'], plan['expired'], '[id,date_upd]'))
+            if plan['to_fetch']:
+                listings.append(_full(resource, plan['to_fetch']))
+        changed = {}
+        for (resource, tag, ids, display), nodes in zip(listings, self._fetch_listings(client, listings)):
+            plan = plans[resource]
+            if display != '[id,date_upd]':
+                plan['fetched'].update(nodes)
+                continue
+            for ps_id in ids:
+                node = nodes.get(ps_id)
+                if node is not None and (node.findtext('date_upd') or '').strip() == plan['cached'][ps_id]['date_upd']:
+                    plan['touched'][ps_id] = dict(plan['cached'][ps_id], cached_at=now)
+                else:
+                    changed.setdefault(resource, set()).add(ps_id)
+                    del plan['cached'][ps_id]
+
+        # Round 2: fetch the entries whose date_upd changed
+        listings = [_full(resource, ids) for resource, ids in changed.items()]
+        for (resource, tag, ids, display), nodes in zip(listings, self._fetch_listings(client, listings)):
+            plans[resource]['fetched'].update(nodes)
+
+        # Cache stores, on this thread
+        result = {resource: {} for resource in wanted}
+        for resource, plan in plans.items():
+            fetched = {ps_id: strip_node(resource, node) for ps_id, node in plan['fetched'].items()}
+            new_entries = {
+                ps_id: {
+                    'date_upd': (node.findtext('date_upd') or '').strip(),
+                    'payload': ET.tostring(node, encoding='unicode'),
+                    'cached_at': now,
+                }
+                for ps_id, node in fetched.items()
+            }
+            entries = dict(plan['touched'], **new_entries)
+            memory_cache_set(dbname, resource, entries)
+            if use_db and entries:
+                DbCache._store(resource, entries)
+
+            _logger.info(
+                "%s: %d cached, %d revalidated, %d fetched",
+                resource, len(plan['cached']) - len(plan['touched']), len(plan['touched']), len(fetched)
+            )
+            nodes = {ps_id: ET.fromstring(entry['payload']) for ps_id, entry in plan['cached'].items()}
+            nodes.update(fetched)
+            result[resource] = nodes
+        return result
+
+    def _fetch_resources_by_id(self, client, resource, tag, ids, display='full'):
+        """Return {id: node} for a resource using filter[id]=[a|b|c]&display=full list queries"""
+        return self._fetch_listings(client, [(resource, tag, ids, display)])[0]
+
+    def _fetch_listings(self, client, listings):
+        """Run [(resource, tag, ids, display)] filter[id] listings in one pool, return one {id: node} per listing"""
+        workers = int(self.env['ir.config_parameter'].sudo().get_param('prestashop.order_import_workers', 4))
+        all_roots = list_filtered_many(client, [
+            (resource, 'id', sorted(str(i) for i in ids), {'display': display})
+            for resource, tag, ids, display in listings
+        ], workers=workers, timeout=120)
+
+        results = [{} for _listing in listings]
+        for index, ((resource, tag, ids, display), roots) in enumerate(zip(listings, all_roots)):
+            for root in roots:
+                for node in root.findall(f'./{resource}/{tag}'):
+                    node_id = (node.findtext('id') or '').strip()
+                    if node_id:
+                        results[index][node_id] = node
+        return results
+
+    def _customer_details_from_nodes(self, customer, address):
+        """Customer details dict from customer and address nodes (either may be None)"""
+        customer_details = {}
+        if customer is not None:
+            customer_details.update({
+                'firstname': self._get_text_content(customer, './/firstname'),
+                'lastname': self._get_text_content(customer, './/lastname'),
+                'email': self._get_text_content(customer, './/email'),
+            })
+        if address is not None:
+            customer_details.update({
+                'phone': self._get_text_content(address, './/phone'),
+                'phone_mobile': self._get_text_content(address, './/phone_mobile'),
+                'company': self._get_text_content(address, './/company'),
+                'address1': self._get_text_content(address, './/address1'),
+                'address2': self._get_text_content(address, './/address2'),
+                'city': self._get_text_content(address, './/city'),
+                'postcode': self._get_text_content(address, './/postcode'),
+                'country_id': self._get_country_id(self._get_text_content(address, './id_country')),
+            })
         return customer_details
+
+    @api.model
+    def _get_country_id(self, ps_country_id):
+        """res.country id for a PrestaShop country id, from a map warmed once per process"""
+        if not ps_country_id or ps_country_id == '0':
+            return False
+
+        def _stale(entry):
+            # Unknown ids (country enabled since) reload the map at most once per COUNTRY_REFRESH_SECONDS
+            return entry is None or (
+                ps_country_id not in entry['ids'] and time.monotonic() - entry['loaded'] > COUNTRY_REFRESH_SECONDS
+            )
+
+        dbname = self.env.cr.dbname
+        entry = _COUNTRY_IDS.get(dbname)
+        if _stale(entry):
+            with _COUNTRY_IDS_LOCK:
+                entry = _COUNTRY_IDS.get(dbname)
+                if _stale(entry):
+                    ids = self._load_country_ids()
+                    if ids is not None:
+                        entry = _COUNTRY_IDS[dbname] = {'ids': ids, 'loaded': time.monotonic()}
+        return entry['ids'].get(ps_country_id, False) if entry else False
+
+    @api.model
+    def _load_country_ids(self):
+        """Map every PrestaShop country to res.country by ISO code, None when the listing fails"""
+        try:
+            response = get_prestashop_client(self.env).get(
+                "countries", params={'display': '[id,iso_code]'}, timeout=120
+            )
+            if response.status_code != 200:
+                _logger.warning("GET countries failed (status %s)", response.status_code)
+                return None
+            root = ET.fromstring(response.content)
+        except Exception as e:
+            _logger.warning("Exception while listing countries: %s", str(e))
+            return None
+
+        iso_by_ps_id = {
+            (node.findtext('id') or '').strip(): (node.findtext('iso_code') or '').strip().upper()
+            for node in root.findall('./countries/country')
+        }
+        countries = self.env['res.country'].sudo().search([('code', 'in', list(set(iso_by_ps_id.values())))])
+        odoo_ids = {country.code.upper(): country.id for country in countries}
+        _logger.info("Loaded %d PrestaShop countries (%d matched)", len(iso_by_ps_id), len(odoo_ids))
+        return {ps_id: odoo_ids[iso] for ps_id, iso in iso_by_ps_id.items() if iso in odoo_ids}
+
+    def _get_complete_customer_details(self, customer_url, address_url):
+        """Fetch complete customer details including address information (through the customer cache)"""
+        client = get_prestashop_client(self.env)
+        customer_id = customer_url.rstrip('/').rsplit('/', 1)[-1] if customer_url else ''
+        address_id = address_url.rstrip('/').rsplit('/', 1)[-1] if address_url else ''
+
+        # Customer and address are fetched together
+        related = self._fetch_cached_resources(client, {
+            'customers': ('customer', [customer_id]),
+            'addresses': ('address', [address_id]),
+        })
+        return self._customer_details_from_nodes(
+            related['customers'].get(customer_id),
+            related['addresses'].get(address_id),
+        )
  
     def _fetch_api_data(self, url):
         """Helper method to fetch data from API"""
         try:
             # Use basic authentication instead of ws_key
-            response = requests.get(url, auth=(self.TOKEN, ''), timeout=300)
+            response = get_prestashop_client(self.env).get(url, timeout=300)
             if response.status_code == 200:
                 return response.content
             else:
@@ -4453,7 +5609,7 @@ class CustomerFetcher(models.TransientModel):
 
         try:
             # Use basic authentication
-            response = requests.get(customer_url, auth=(self.TOKEN, ''), timeout=300)
+            response = get_prestashop_client(self.env).get(customer_url, timeout=300)
             if response.status_code == 200:
                 tree = ET.fromstring(response.content)
                 firstname = tree.find('.//firstname')
@@ -4511,11 +5667,7 @@ class CustomerFetcher(models.TransientModel):
                 partner = partners[0]
 
         # Prepare partner values with ALL PrestaShop data
-        country_id = False
-        if customer_details.get('country'):
-            country = self.env['res.country'].search([('name', '=', customer_details.get('country'))], limit=1)
-            if country:
-                country_id = country.id
+        country_id = customer_details.get('country_id', False)
 
         partner_vals = {
             'name': full_name,
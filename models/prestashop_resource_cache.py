@@ -0,0 +1,101 @@
+from odoo import models, fields, api
+import calendar
+import threading
+import xml.etree.ElementTree as ET
+import logging
+_logger = logging.getLogger(__name__)
+
+MEMORY_CACHE_SIZE = 5000
+
+# Only what the order import reads (_customer_details_from_nodes) is fetched and
+# cached: no password hash, secure_key, birthday or notes
+CACHED_FIELDS = {
+    'customers': ('id', 'date_upd', 'firstname', 'lastname', 'email'),
+    'addresses': (
+        'id', 'date_upd', 'phone', 'phone_mobile', 'company',
+        'address1', 'address2', 'city', 'postcode', 'id_country',
+    ),
+}
+
+# (dbname, resource, ps_id) -> {'date_upd', 'payload', 'cached_at'}, shared by every cursor of the process
+_MEMORY_CACHE = {}
+_MEMORY_CACHE_LOCK = threading.Lock()
+
+
+def memory_cache_get(dbname, resource, ps_ids):
+    with _MEMORY_CACHE_LOCK:
+        return {
+            ps_id: dict(_MEMORY_CACHE[(dbname, resource, ps_id)])
+            for ps_id in ps_ids if (dbname, resource, ps_id) in _MEMORY_CACHE
+        }
+
+
+def memory_cache_set(dbname, resource, entries):
+    with _MEMORY_CACHE_LOCK:
+        for ps_id, entry in entries.items():
+            _MEMORY_CACHE[(dbname, resource, ps_id)] = dict(entry)
+        if len(_MEMORY_CACHE) > MEMORY_CACHE_SIZE:
+            # Drop the oldest half
+            oldest = sorted(_MEMORY_CACHE, key=lambda key: _MEMORY_CACHE[key]['cached_at'])
+            for key in oldest[:len(oldest) // 2]:
+                del _MEMORY_CACHE[key]
+
+
+def cached_fields_display(resource):
+    """display= value listing the cached fields of a resource"""
+    return f"[{','.join(CACHED_FIELDS[resource])}]"
+
+
+def strip_node(resource, node):
+    """Copy of a customer/address node reduced to CACHED_FIELDS, as text only"""
+    stripped = ET.Element(node.tag)
+    for name in CACHED_FIELDS[resource]:
+        ET.SubElement(stripped, name).text = (node.findtext(name) or '').strip()
+    return stripped
+
+
+class PrestashopResourceCache(models.Model):
+    _name = 'prestashop.resource.cache'
+    _description = 'Cached PrestaShop customer / address'
+    _rec_name = 'ps_id'
+
+    resource = fields.Char(string="Resource", required=True, index=True, readonly=True)
+    ps_id = fields.Char(string="PrestaShop ID", required=True, index=True, readonly=True)
+    date_upd = fields.Char(string="PrestaShop date_upd", readonly=True)
+    payload = fields.Text(string="XML", readonly=True)
+    cached_at = fields.Datetime(string="Cached At", required=True, default=fields.Datetime.now, readonly=True)
+
+    _sql_constraints = [
+        ('resource_ps_id_uniq', 'unique(resource, ps_id)',
+         'A PrestaShop record can only be cached once.'),
+    ]
+
+    @api.model
+    def _lookup(self, resource, ps_ids):
+        """Return {ps_id: {'date_upd', 'payload', 'cached_at' (epoch)}}"""
+        result = {}
+        for rec in self.search([('resource', '=', resource), ('ps_id', 'in', list(ps_ids))]):
+            result[rec.ps_id] = {
+                'date_upd': rec.date_upd,
+                'payload': rec.payload,
+                'cached_at': calendar.timegm(rec.cached_at.timetuple()),
+            }
+        return result
+
+    @api.model
+    def _store(self, resource, entries):
+        """Create or refresh the rows of {ps_id: entry}"""
+        existing = {rec.ps_id: rec for rec in self.search([('resource', '=', resource), ('ps_id', 'in', list(entries))])}
+        to_create = []
+        for ps_id, entry in entries.items():
+            vals = {
+                'date_upd': entry['date_upd'],
+                'payload': entry['payload'],
+                'cached_at': fields.Datetime.now(),
+            }
+            if ps_id in existing:
+                existing[ps_id].write(vals)
+            else:
+                to_create.append(dict(vals, resource=resource, ps_id=ps_id))
+        if to_create:
+            self.create(to_create)
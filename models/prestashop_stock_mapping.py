@@ -0,0 +1,98 @@
+from odoo import models, fields, api
+from datetime import timedelta
+import xml.etree.ElementTree as ET
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class PrestashopStockMapping(models.Model):
+    _name = 'prestashop.stock.mapping'
+    _description = 'PrestaShop combination / stock_available mapping'
+    _rec_name = 'product_id'
+
+    product_id = fields.Many2one('product.product', string="Produit", required=True, ondelete='cascade', index=True)
+    ps_product_id = fields.Integer(string="PrestaShop Product ID")
+    combination_id = fields.Integer(string="PrestaShop Combination ID", index=True)
+    stock_available_id = fields.Integer(string="PrestaShop Stock Available ID", required=True)
+    id_shop = fields.Integer(string="PrestaShop Shop ID")
+    id_shop_group = fields.Integer(string="PrestaShop Shop Group ID")
+    depends_on_stock = fields.Integer(string="Depends On Stock")
+    out_of_stock = fields.Integer(string="Out Of Stock Behaviour", default=2)
+    last_pushed_qty = fields.Integer(string="Last Pushed Quantity")
+    last_push_date = fields.Datetime(string="Last Push")
+    last_lookup_date = fields.Datetime(string="Last Lookup", required=True, default=fields.Datetime.now)
+
+    _sql_constraints = [
+        ('product_stock_available_uniq', 'unique(product_id, stock_available_id)',
+         'A stock_available can only be mapped once per product.'),
+    ]
+
+    @api.model
+    def _get_fresh_mappings(self, product_ids):
+        """Return {product_id: mappings} for mappings looked up within the TTL"""
+        ttl_days = int(self.env['ir.config_parameter'].sudo().get_param('prestashop.stock_mapping_ttl_days', 7))
+        limit = fields.Datetime.now() - timedelta(days=ttl_days)
+
+        mappings = self.search([
+            ('product_id', 'in', list(product_ids)),
+            ('last_lookup_date', '>=', limit),
+        ])
+        result = {}
+        for mapping in mappings:
+            result.setdefault(mapping.product_id.id, self.browse())
+            result[mapping.product_id.id] |= mapping
+        return result
+
+    @api.model
+    def _store_from_node(self, product_id, node):
+        """Create or refresh the mapping from a stock_available node (display=full)"""
+        def _int(tag):
+            value = (node.findtext(tag) or '').strip()
+            return int(value) if value.lstrip('-').isdigit() else 0
+
+        vals = {
+            'product_id': product_id,
+            'ps_product_id': _int('id_product'),
+            'combination_id': _int('id_product_attribute'),
+            'stock_available_id': _int('id'),
+            'id_shop': _int('id_shop'),
+            'id_shop_group': _int('id_shop_group'),
+            'depends_on_stock': _int('depends_on_stock'),
+            'out_of_stock': _int('out_of_stock'),
+            # Quantity PrestaShop holds right now, so the next push can be compared to it
+            'last_pushed_qty': _int('quantity'),
+            'last_lookup_date': fields.Datetime.now(),
+        }
+        mapping = self.search([
+            ('product_id', '=', product_id),
+            ('stock_available_id', '=', vals['stock_available_id']),
+        ], limit=1)
+        if mapping:
+            mapping.write(vals)
+            return mapping
+        return self.create(vals)
+
+    def _to_stock_available_node(self):
+        """Rebuild a stock_available node that can be PUT without fetching it first"""
+        self.ensure_one()
+        node = ET.Element('stock_available')
+        for tag, value in [
+            ('id', self.stock_available_id),
+            ('id_product', self.ps_product_id),
+            ('id_product_attribute', self.combination_id),
+            ('id_shop', self.id_shop),
+            ('id_shop_group', self.id_shop_group),
+            ('quantity', self.last_pushed_qty),
+            ('depends_on_stock', self.depends_on_stock),
+            ('out_of_stock', self.out_of_stock),
+        ]:
+            ET.SubElement(node, tag).text = str(value)
+        return node
+
+
+class PrestashopStockEvent(models.Model):
+    _name = 'prestashop.stock.event'
+    _description = 'Pending PrestaShop stock sync event'
+    _order = 'id'
+
+    product_id = fields.Many2one('product.product', string="Produit", required=True, ondelete='cascade')
@@ -0,0 +1,56 @@
+from odoo import models, fields, api
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class PrestashopVariantImage(models.Model):
+    _name = 'prestashop.variant.image'
+    _description = 'Image already uploaded to a PrestaShop product'
+    _rec_name = 'source_url'
+
+    ps_product_id = fields.Integer(string="PrestaShop Product ID", required=True, index=True)
+    source_url = fields.Char(string="Source URL", required=True)
+    content_hash = fields.Char(string="SHA-256", index=True)
+    image_id = fields.Integer(string="PrestaShop Image ID", required=True)
+    etag = fields.Char(string="ETag")
+    last_modified = fields.Char(string="Last-Modified")
+
+    _sql_constraints = [
+        ('product_url_uniq', 'unique(ps_product_id, source_url)',
+         'An image URL can only be stored once per PrestaShop product.'),
+    ]
+
+    @api.model
+    def _get_known_images(self, ps_product_ids):
+        """Return ({(ps_product_id, url): vals}, {ps_product_id: {content_hash: image_id}})"""
+        by_url = {}
+        by_hash = {}
+        for image in self.search([('ps_product_id', 'in', list(ps_product_ids))]):
+            by_url[(image.ps_product_id, image.source_url)] = {
+                'image_id': image.image_id,
+                'content_hash': image.content_hash,
+                'etag': image.etag,
+                'last_modified': image.last_modified,
+            }
+            if image.content_hash:
+                by_hash.setdefault(image.ps_product_id, {})[image.content_hash] = image.image_id
+        return by_url, by_hash
+
+    @api.model
+    def _store(self, ps_product_id, source_url, vals):
+        """Create or refresh the row for (ps_product_id, source_url)"""
+        image = self.search([('ps_product_id', '=', ps_product_id), ('source_url', '=', source_url)], limit=1)
+        vals = dict(vals, ps_product_id=ps_product_id, source_url=source_url)
+        if image:
+            image.write(vals)
+        else:
+            self.create(vals)
+
+    @api.model
+    def _forget(self, keys):
+        """Delete the rows of [(ps_product_id, source_url)]"""
+        keys = set(keys)
+        if not keys:
+            return
+        images = self.search([('ps_product_id', 'in', list({ps_product_id for ps_product_id, _url in keys}))])
+        images.filtered(lambda image: (image.ps_product_id, image.source_url) in keys).unlink()
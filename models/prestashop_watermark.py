@@ -0,0 +1,29 @@
+from odoo import models, fields, api
+import logging
+_logger = logging.getLogger(__name__)
+
+
+class PrestashopWatermark(models.Model):
+    _name = 'prestashop.watermark'
+    _description = 'PrestaShop sync watermark'
+
+    # Written on every poll, hence a row rather than a system parameter (see AdaptiveBatcher)
+    name = fields.Char(string="Name", required=True)
+    value = fields.Char(string="Value")
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'One value per watermark.'),
+    ]
+
+    @api.model
+    def _get(self, name, default=False):
+        record = self.search([('name', '=', name)], limit=1)
+        return record.value if record and record.value else default
+
+    @api.model
+    def _set(self, name, value):
+        record = self.search([('name', '=', name)], limit=1)
+        if record:
+            record.value = value
+        else:
+            self.create({'name': name, 'value': value})
@@ -33,6 +33,15 @@ class StockPicking(models.Model):
 
         return res
 
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    def _action_done(self, cancel_backorder=False):
+        moves = super()._action_done(cancel_backorder=cancel_backorder)
+        # Event-driven PrestaShop stock sync (no-op unless enabled)
+        self.env['product.product']._queue_stock_sync_event(moves.product_id.ids)
+        return moves
+
 class StockPickingBatch(models.Model):
     _inherit = 'stock.picking.batch'
 